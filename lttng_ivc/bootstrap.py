@@ -5,41 +5,13 @@ import logging
 import hashlib
 
 from git import Repo
+from concurrent.futures import ThreadPoolExecutor
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 sys.path.insert(0, os.path.join(dir_path, ".."))
 
 import settings as Settings
-
-def is_ref_branch(repo, ref):
-    try:
-        repo.remote().refs[ref]
-        is_branch = True
-    except:
-        is_branch = False
-
-    return is_branch
-
-
-def is_ref_tag(repo, ref):
-    try:
-        repo.tags[ref]
-        is_tag = True
-    except:
-        is_tag = False
-
-    return is_tag
-
-
-def is_ref_commit(repo, ref):
-    try:
-        Repo.rev_parse(repo, ref)
-        is_commit = True
-    except:
-        is_commit = False
-
-    return is_commit
-
+import utils.remote as Remote
 
 def logging_setup():
     logger_format = '%(asctime)s %(name)-12s %(levelname)-8s %(message)s'
@@ -87,8 +59,10 @@ for project, markers in config.items():
                     raise Exception("{} is not defined".format(dep))
 
 
-# Retrieve all possibles remotes and clean url for path
+# Retrieve all possibles remotes and clean url for path, along with the
+# references used for each of them.
 remotes = {}
+remote_refs = {}
 for project, markers in config.items():
     if markers is None:
         continue
@@ -97,24 +71,28 @@ for project, markers in config.items():
         url2path = hashlib.sha1(url.encode('utf8')).hexdigest()
         path = os.path.abspath(Settings.git_remote_folder + '/' + url2path)
         remotes[url] = path
+        remote_refs.setdefault(url, set()).add(marker['ref'])
 
 logger_git.info('Remotes to be fetched {}'.format(remotes))
 
 if not os.path.isdir(Settings.git_remote_folder):
     os.makedirs(Settings.git_remote_folder)
 
-# Fetch the remote
-for url, path in remotes.items():
-    if os.path.exists(path):
-        if not os.path.isdir(path):
-            logger_git.error('Remote path {} exists and is not a folder'.format(path))
-            exit()
-        repo = Repo(path)
-    else:
-        repo = Repo.clone_from(url, path)
+# Fetch the remotes concurrently
+with ThreadPoolExecutor(max_workers=max(1, len(remotes))) as executor:
+    futures = {url: executor.submit(Remote.update_remote, url, path, remote_refs[url])
+               for url, path in remotes.items()}
+    for url, future in futures.items():
+        try:
+            future.result()
+        except Exception as e:
+            logger_git.error('Failed to update remote {}: {}'.format(url, e))
+            exit(1)
 
-    # TODO: might be necessary to actually update the base branch, to validate
-    repo.remote().fetch()
+# Resolve all references of a remote at once
+resolved_refs = {}
+for url, path in remotes.items():
+    resolved_refs[url] = Remote.resolve_refs(Repo(path), remote_refs[url])
 
 # Create marker definition for test runners
 runnable_markers = {}
@@ -131,21 +109,13 @@ for project, markers in config.items():
             deps = []
 
         path = remotes[url]
-        repo = Repo(path)
-
-        git_object = None
-        if is_ref_branch(repo, ref):
-            git_object = Repo.rev_parse(repo, repo.remote().refs[ref].name)
-        elif is_ref_tag(repo, ref):
-            git_object = repo.tags[ref].commit
-        elif is_ref_commit(repo, ref):
-            git_object = repo.commit(ref)
 
-        if git_object is None:
+        sha1 = resolved_refs[url].get(ref)
+        if sha1 is None:
             logger_git.error('Invalid git reference for marker "{}"'.format(name))
             exit(1)
 
-        logger_git.info('Marker:{: <30}  Sha1 {: <20}'.format(name, git_object.hexsha))
+        logger_git.info('Marker:{: <30}  Sha1 {: <20}'.format(name, sha1))
 
         if name in runnable_markers:
             logger_git.error('Duplicate for entry for marker "{}"'.format(name))
@@ -153,7 +123,7 @@ for project, markers in config.items():
 
         runnable_markers[name] = {
                 'project': project,
-                'sha1': git_object.hexsha,
+                'sha1': sha1,
                 'url': url,
                 'path': path,
                 'deps': deps
@@ -21,29 +21,68 @@
 import os
 import sys
 import logging
-
-import yaml
+import argparse
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 sys.path.insert(0, os.path.join(dir_path, ".."))
 
 import utils.ProjectFactory as ProjectFactory
+import utils.scheduler as Scheduler
+import utils.jobserver as Jobserver
+import utils.planner as Planner
 import settings as Settings
 
 logging.basicConfig(level=logging.INFO)
 _logger = logging.getLogger('project.cache_builder')
 
-projects_under_test = {}
 
-# Fetch the project under test
-# We start with the complete set and substract deprecated projects
-with open(Settings.run_configuration_file, 'r') as stream:
-    projects_under_test = set(yaml.load(stream, Loader=yaml.FullLoader))
+def build(label):
+    _logger.info('Preparing and building %s', label)
+    ProjectFactory.get_precook(label)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the projects cache")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Maximum number of projects built concurrently")
+    parser.add_argument('--cpu-budget', type=int, default=None,
+                        help="Total number of make jobs shared by the concurrent builds")
+    parser.add_argument('--plan-only', action='store_true',
+                        help="Print the projects to rebuild and exit")
+    args = parser.parse_args()
+
+    # Fetch the project under test
+    # We start with the complete set and substract deprecated projects
+    markers = Planner.load_markers(Settings.run_configuration_file)
+    built_markers = Planner.load_markers(Settings.built_run_configuration_file)
+
+    projects_under_test = set(markers).difference(Settings.projects_deprecated)
+    graph = {label: marker['deps'] for label, marker in markers.items()}
+
+    # Only rebuild what changed since the last build, or is not cached
+    plan = Planner.plan(built_markers, markers, projects_under_test,
+                        is_cached=ProjectFactory.is_precooked)
+    for label in sorted(plan):
+        print("{: <30} {}".format(label, plan[label]))
+    if args.plan_only:
+        return
+
+    # All concurrent builds take their make jobs from a single jobserver
+    Jobserver.start(args.cpu_budget)
+
+    # Prebuild all projects
+    failed = Scheduler.schedule(graph, plan, build, workers=args.workers)
+
+    # Record what is built for the next plan
+    for label in Scheduler.dependency_closure(graph, projects_under_test):
+        if label not in failed:
+            built_markers[label] = markers[label]
+    Planner.save_markers(Settings.built_run_configuration_file, built_markers)
+
+    if failed:
+        _logger.error('Failed to build: %s', ', '.join(sorted(failed)))
+        sys.exit(1)
 
-projects_under_test = projects_under_test.difference(Settings.projects_deprecated)
 
-# Prebuild all projects
-for key in projects_under_test:
-    _logger.info('Preparing and building %s', key)
-    ProjectFactory.get_precook(key)
-    _logger.info('Done: %s', key)
+if __name__ == '__main__':
+    main()
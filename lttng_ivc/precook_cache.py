@@ -0,0 +1,102 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import sys
+import logging
+import argparse
+
+import yaml
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+
+import utils.ProjectFactory as ProjectFactory
+import utils.cache_manager as CacheManager
+import settings as Settings
+
+logging.basicConfig(level=logging.INFO)
+_logger = logging.getLogger('project.precook_cache')
+
+
+def get_labels(labels):
+    if labels:
+        return labels
+    # Default to all the projects under test
+    with open(Settings.run_configuration_file, 'r') as stream:
+        markers = yaml.load(stream, Loader=yaml.FullLoader)
+    return sorted(set(markers).difference(Settings.projects_deprecated))
+
+
+def export_command(args):
+    for label in get_labels(args.labels):
+        ProjectFactory.export_precook(label, args.folder)
+
+
+def import_command(args):
+    missing = []
+    for label in get_labels(args.labels):
+        if not ProjectFactory.import_precook(label, args.folder):
+            missing.append(label)
+    if missing:
+        _logger.error('No bundle available for: %s', ', '.join(missing))
+        sys.exit(1)
+
+
+def gc_command(args):
+    reclaimed = ProjectFactory.collect_garbage(CacheManager.parse_size(args.budget))
+    print("Reclaimed {} bytes ({:.1f} MiB)".format(reclaimed, reclaimed / (1 << 20)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the precooked projects cache")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    export_parser = subparsers.add_parser('export',
+            help="Build if needed and publish precooked projects as bundles")
+    export_parser.set_defaults(func=export_command)
+
+    import_parser = subparsers.add_parser('import',
+            help="Import precooked projects from published bundles")
+    import_parser.set_defaults(func=import_command)
+
+    for subparser in [export_parser, import_parser]:
+        subparser.add_argument('--folder',
+                default=Settings.precook_bundle_folder,
+                required=Settings.precook_bundle_folder is None,
+                help="Folder holding the bundles, defaults to $LTTNG_IVC_PRECOOK_BUNDLE_FOLDER")
+        subparser.add_argument('labels', nargs='*',
+                help="Labels to process, defaults to all projects under test")
+
+    gc_parser = subparsers.add_parser('gc',
+            help="Evict least recently used precooked projects over the budget")
+    gc_parser.add_argument('--budget',
+            default=Settings.projects_cache_budget,
+            required=Settings.projects_cache_budget is None,
+            help="Size budget of the cache (e.g. 20G), defaults to $LTTNG_IVC_PROJECTS_CACHE_BUDGET")
+    gc_parser.set_defaults(func=gc_command)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 import os
 import yaml
+import tempfile
 import itertools
 import pytest
 import _pytest
@@ -16,9 +17,45 @@ base_dir = os.path.dirname(os.path.abspath(__file__))
 
 configuration_file = os.path.join(base_dir, "config.yaml")
 run_configuration_file = os.path.join(base_dir, "run_configuration.yaml")
+# Run configuration of the last successful projects build
+built_run_configuration_file = os.path.join(base_dir, "built_run_configuration.yaml")
 
 projects_cache_folder = os.path.join(base_dir, "runtime/projects_cache")
 git_remote_folder = os.path.join(base_dir, "runtime/git_remote")
+bootstrap_cache_folder = os.path.join(base_dir, "runtime/bootstrap_cache")
+configure_cache_folder = os.path.join(base_dir, "runtime/configure_cache")
+apps_cache_folder = os.path.join(base_dir, "runtime/apps_cache")
+java_cds_folder = os.path.join(base_dir, "runtime/java_cds")
+
+# Size budget of projects_cache_folder, e.g. 20G. When set, least recently
+# used precooked projects are evicted after a new one is published.
+projects_cache_budget = os.environ.get("LTTNG_IVC_PROJECTS_CACHE_BUDGET")
+
+# Size budget of bootstrap_cache_folder, least recently used bootstrap
+# outputs are evicted after a new one is saved.
+bootstrap_cache_budget = os.environ.get("LTTNG_IVC_BOOTSTRAP_CACHE_BUDGET", "1G")
+
+# Run java applications from class data sharing archives of the lttng-ust
+# agent jars (JDK >= 10). Set to 0 to disable.
+java_cds = os.environ.get("LTTNG_IVC_JAVA_CDS", "1") != "0"
+
+# Ports handed to daemons are taken from ports_range_start up to the start of
+# the ephemeral port range, split between pytest-xdist workers. Reservations
+# are shared with concurrent runs through lock files in ports_folder.
+ports_range_start = int(os.environ.get("LTTNG_IVC_PORTS_RANGE_START", "10000"))
+ports_folder = os.path.join(tempfile.gettempdir(), "lttng-ivc-ports")
+
+# Retention of the lttng home folder of a runtime (traces, session
+# configurations, daemon logs) on close: "always", "on-failure" or
+# "logs-only", which leaves trace stream files out. Retained folders are
+# stored as gzipped tarballs when LTTNG_IVC_RUNTIME_RETENTION_COMPRESS=1.
+runtime_retention = os.environ.get("LTTNG_IVC_RUNTIME_RETENTION", "always")
+runtime_retention_compress = os.environ.get(
+    "LTTNG_IVC_RUNTIME_RETENTION_COMPRESS", "0") != "0"
+
+# Shared folder (e.g. NFS mount) holding exported precooked project bundles.
+# When set, missing precooked projects are imported from it before building.
+precook_bundle_folder = os.environ.get("LTTNG_IVC_PRECOOK_BUNDLE_FOLDER")
 
 apps_folder = os.path.join(base_dir, "apps")
 apps_gen_events_folder = os.path.join(apps_folder, "gen_ust_events")
@@ -30,9 +67,6 @@ apps_python = os.path.join(apps_folder, "python")
 traces_folder = os.path.join(base_dir, "traces")
 trace_lost_packet = os.path.join(traces_folder, "packet_lost_2_stream")
 
-# Used for checksum validation
-project_py_file_location = os.path.join(base_dir, "utils/project.py")
-
 tmp_object_prefix = "lttng-ivc-"
 
 default_babeltrace = "babeltrace-2.0"
@@ -20,7 +20,6 @@
 
 import pytest
 import os
-import shutil
 import filecmp
 import sys
 
@@ -201,8 +200,7 @@ def test_babeltrace_base_ust(tmpdir, babeltrace_l, tools_l):
         runtime.add_project(babeltrace)
 
         # Make application using the runtime
-        shutil.copytree(Settings.apps_gen_events_folder, app_path)
-        runtime.run("make V=1", cwd=app_path)
+        runtime.build_app(Settings.apps_gen_events_folder, app_path)
 
         # Start lttng-sessiond
         sessiond = utils.sessiond_spawn(runtime)
@@ -341,8 +339,7 @@ def test_babeltrace_same_trace_ust(tmpdir, babeltrace_list, tools_l):
     with Run.get_runtime(str(tmpdir)) as runtime:
         runtime.add_project(tools)
 
-        shutil.copytree(Settings.apps_gen_events_folder, app_path)
-        runtime.run("make V=1", cwd=app_path)
+        runtime.build_app(Settings.apps_gen_events_folder, app_path)
 
         sessiond = utils.sessiond_spawn(runtime)
 
@@ -20,8 +20,6 @@
 
 import pytest
 import os
-import shutil
-import time
 import socket
 
 from flaky import flaky
@@ -120,11 +118,12 @@ def test_babeltrace_live(tmpdir, babeltrace_l, tools_l):
         runtime.add_project(tools)
         runtime.add_project(babeltrace)
 
-        shutil.copytree(Settings.apps_gen_events_folder, app_path)
-        runtime.run("make V=1", cwd=app_path)
-
-        relayd, ctrl_port, data_port, live_port = utils.relayd_spawn(runtime)
-        sessiond = utils.sessiond_spawn(runtime)
+        # Build the application while the daemons start
+        _, (relayd, ctrl_port, data_port, live_port), sessiond = Run.run_concurrently(
+            runtime.async_build_app(Settings.apps_gen_events_folder, app_path),
+            utils.async_relayd_spawn(runtime),
+            utils.async_sessiond_spawn(runtime),
+        )
 
         hostname = socket.gethostname()
         url_babeltrace = "net://localhost:{}/host/{}/{}".format(
@@ -144,21 +143,10 @@ def test_babeltrace_live(tmpdir, babeltrace_l, tools_l):
             "babeltrace -i lttng-live {}".format(url_babeltrace)
         )
 
-        # TODO: Move to settings
-        timeout = 60
         # TODO: Move to settings
         # Make sure that babeltrace did hook itself or at least tried to.
         synchro_text = "Viewer is establishing a connection to the relayd"
-        listening = False
-        for i in range(timeout):
-            log = runtime.get_subprocess_stderr_path(relayd)
-            if utils.file_contains(log, synchro_text):
-                listening = True
-                break
-            time.sleep(1)
-
-        if not listening:
-            raise Exception("Babeltrace live is not listening after timeout")
+        runtime.wait_for_output(relayd, synchro_text)
 
         # Run application
         cmd = "./app {}".format(nb_loop)
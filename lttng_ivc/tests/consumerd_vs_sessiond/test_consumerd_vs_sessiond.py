@@ -21,7 +21,6 @@
 import pytest
 import subprocess
 import platform
-import shutil
 import os
 
 import lttng_ivc.utils.ProjectFactory as ProjectFactory
@@ -142,8 +141,7 @@ def test_consumerd_vs_sessiond(tmpdir, consumerd_l, tools_l, should_work):
             if 'urcu' in consumerd.dependencies:
                 runtime.add_project(consumerd.dependencies['urcu'])
 
-            shutil.copytree(Settings.apps_gen_events_folder, app_path)
-            runtime.run("make V=1", cwd=app_path)
+            runtime.build_app(Settings.apps_gen_events_folder, app_path)
 
             utils.sessiond_spawn(runtime, sessiond_opt_args)
 
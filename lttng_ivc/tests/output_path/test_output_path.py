@@ -221,8 +221,7 @@ def test_output_path_local(tmpdir, version, mode):
         runtime.add_project(lttng_tools)
 
         # Make application using the runtime
-        shutil.copytree(Settings.apps_gen_events_folder, app_path)
-        runtime.run("make V=1", cwd=app_path)
+        runtime.build_app(Settings.apps_gen_events_folder, app_path)
 
         sessiond = utils.sessiond_spawn(runtime)
 
@@ -307,7 +306,7 @@ def test_output_path_snapshot_local_on_create(tmpdir, version, mode):
         runtime.add_project(lttng_tools)
 
         # Make application using the runtime
-        runtime.run("make V=1", cwd=app_path)
+        runtime.build_app(Settings.apps_gen_events_folder, app_path)
 
         sessiond = utils.sessiond_spawn(runtime)
 
@@ -324,7 +323,7 @@ def test_output_path_snapshot_local_on_create(tmpdir, version, mode):
             # in per-uid buffering mode.
             cmd = "./app {} 0 {} {}".format(nb_loop, app_sync_start, app_sync_end)
             app_id = runtime.spawn_subprocess(cmd, cwd=app_path)
-            utils.wait_for_file(app_sync_start)
+            runtime.wait_for_file(app_sync_start, app_id)
 
             runtime.run("lttng snapshot record")
 
@@ -387,7 +386,7 @@ def test_output_path_snapshot_local_add_output(tmpdir, version, mode):
         runtime.add_project(lttng_tools)
 
         # Make application using the runtime
-        runtime.run("make V=1", cwd=app_path)
+        runtime.build_app(Settings.apps_gen_events_folder, app_path)
 
         sessiond = utils.sessiond_spawn(runtime)
 
@@ -407,7 +406,7 @@ def test_output_path_snapshot_local_add_output(tmpdir, version, mode):
             # in per-uid buffering mode.
             cmd = "./app {} 0 {} {}".format(nb_loop, app_sync_start, app_sync_end)
             app_id = runtime.spawn_subprocess(cmd, cwd=app_path)
-            utils.wait_for_file(app_sync_start)
+            runtime.wait_for_file(app_sync_start, app_id)
 
             runtime.run("lttng snapshot record")
 
@@ -457,7 +456,7 @@ def test_output_path_relayd(tmpdir, client, server, mode):
         rt_relayd.add_project(relay)
 
         # Make application using the lttng_tools runtime
-        rt_tools.run("make V=1", cwd=app_path)
+        rt_tools.build_app(Settings.apps_gen_events_folder, app_path)
 
         sessiond = utils.sessiond_spawn(rt_tools)
         relayd, ctrl_port, data_port, live_port = utils.relayd_spawn(rt_relayd)
@@ -570,7 +569,7 @@ def test_output_path_snapshot_relayd_on_create(tmpdir, client, server, mode, sta
         rt_relayd.add_project(relay)
 
         # Make application using the runtime
-        rt_tools.run("make V=1", cwd=app_path)
+        rt_tools.build_app(Settings.apps_gen_events_folder, app_path)
 
         sessiond = utils.sessiond_spawn(rt_tools)
         relayd, ctrl_port, data_port, live_port = utils.relayd_spawn(rt_relayd)
@@ -658,7 +657,7 @@ def test_output_path_snapshot_relayd_on_create(tmpdir, client, server, mode, sta
             # in per-uid buffering mode.
             cmd = "./app {} 0 {} {}".format(nb_loop, app_sync_start, app_sync_end)
             app_id = rt_tools.spawn_subprocess(cmd, cwd=app_path)
-            utils.wait_for_file(app_sync_start)
+            rt_tools.wait_for_file(app_sync_start, app_id)
 
             rt_tools.run("lttng snapshot record")
 
@@ -717,7 +716,7 @@ def test_output_path_snapshot_relayd_add_output(tmpdir, client, server, mode, st
         rt_relayd.add_project(relay)
 
         # Make application using the runtime
-        rt_tools.run("make V=1", cwd=app_path)
+        rt_tools.build_app(Settings.apps_gen_events_folder, app_path)
 
         sessiond = utils.sessiond_spawn(rt_tools)
         relayd, ctrl_port, data_port, live_port = utils.relayd_spawn(rt_relayd)
@@ -799,7 +798,7 @@ def test_output_path_snapshot_relayd_add_output(tmpdir, client, server, mode, st
             # in per-uid buffering mode.
             cmd = "./app {} 0 {} {}".format(nb_loop, app_sync_start, app_sync_end)
             app_id = rt_tools.spawn_subprocess(cmd, cwd=app_path)
-            utils.wait_for_file(app_sync_start)
+            rt_tools.wait_for_file(app_sync_start, app_id)
 
             rt_tools.run("lttng snapshot record")
 
@@ -20,7 +20,6 @@
 
 import pytest
 import os
-import shutil
 import signal
 import subprocess
 import time
@@ -304,13 +303,13 @@ def test_relayd_vs_consumerd_streaming_base(
         runtime_relayd.add_project(babeltrace)
         runtime_consumerd.add_project(consumerd)
 
-        # Make application using the ust runtime
-        shutil.copytree(Settings.apps_gen_events_folder, app_path)
-        runtime_consumerd.run("make V=1", cwd=app_path)
-
-        # Start lttng-sessiond
-        relayd, ctrl_port, data_port, live_port = utils.relayd_spawn(runtime_relayd)
-        sessiond = utils.sessiond_spawn(runtime_consumerd)
+        # Make application using the ust runtime while lttng-relayd and
+        # lttng-sessiond start
+        _, (relayd, ctrl_port, data_port, live_port), sessiond = Run.run_concurrently(
+            runtime_consumerd.async_build_app(Settings.apps_gen_events_folder, app_path),
+            utils.async_relayd_spawn(runtime_relayd),
+            utils.async_sessiond_spawn(runtime_consumerd),
+        )
 
         url = "net://localhost:{}:{}".format(ctrl_port, data_port)
 
@@ -367,13 +366,13 @@ def test_relayd_vs_consumerd_streaming_regenerate_metadata(
 
         babeltrace_cmd = "babeltrace {}".format(runtime_relayd.lttng_home)
 
-        # Make application using the ust runtime
-        shutil.copytree(Settings.apps_gen_events_folder, app_path)
-        runtime_consumerd.run("make V=1", cwd=app_path)
-
-        # Start lttng-relayd
-        relayd, ctrl_port, data_port, live_port = utils.relayd_spawn(runtime_relayd)
-        sessiond = utils.sessiond_spawn(runtime_consumerd)
+        # Make application using the ust runtime while lttng-relayd and
+        # lttng-sessiond start
+        _, (relayd, ctrl_port, data_port, live_port), sessiond = Run.run_concurrently(
+            runtime_consumerd.async_build_app(Settings.apps_gen_events_folder, app_path),
+            utils.async_relayd_spawn(runtime_relayd),
+            utils.async_sessiond_spawn(runtime_consumerd),
+        )
 
         url = "net://localhost:{}:{}".format(ctrl_port, data_port)
 
@@ -457,13 +456,13 @@ def test_relayd_vs_consumerd_live_base(tmpdir, relayd_label, consumerd_label, sc
         runtime_relayd.add_project(babeltrace)
         runtime_consumerd.add_project(consumerd)
 
-        # Make application using the ust runtime
-        shutil.copytree(Settings.apps_gen_events_folder, app_path)
-        runtime_consumerd.run("make V=1", cwd=app_path)
-
-        # Start lttng-relayd
-        relayd, ctrl_port, data_port, live_port = utils.relayd_spawn(runtime_relayd)
-        sessiond = utils.sessiond_spawn(runtime_consumerd)
+        # Make application using the ust runtime while lttng-relayd and
+        # lttng-sessiond start
+        _, (relayd, ctrl_port, data_port, live_port), sessiond = Run.run_concurrently(
+            runtime_consumerd.async_build_app(Settings.apps_gen_events_folder, app_path),
+            utils.async_relayd_spawn(runtime_relayd),
+            utils.async_sessiond_spawn(runtime_consumerd),
+        )
 
         url = "net://localhost:{}:{}".format(ctrl_port, data_port)
 
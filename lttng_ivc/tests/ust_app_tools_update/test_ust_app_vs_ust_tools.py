@@ -20,7 +20,6 @@
 
 import pytest
 import os
-import shutil
 import signal
 import subprocess
 
@@ -151,8 +150,7 @@ def test_ust_app_tools_update_tracing_available(
         trace_path = os.path.join(runtime_tools.lttng_home, "trace")
 
         # Make application using the ust runtime
-        shutil.copytree(Settings.apps_gen_events_folder, app_path)
-        runtime_app.run("make V=1", cwd=app_path)
+        runtime_app.build_app(Settings.apps_gen_events_folder, app_path)
 
         # Start lttng-sessiond
         sessiond = utils.sessiond_spawn(runtime_tools)
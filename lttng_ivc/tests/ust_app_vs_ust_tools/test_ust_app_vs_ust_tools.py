@@ -20,7 +20,6 @@
 
 import pytest
 import os
-import shutil
 import signal
 import subprocess
 
@@ -203,8 +202,7 @@ def test_ust_app_tracing_available(tmpdir, ust_label, tools_label, outcome):
         trace_path = os.path.join(runtime_tools.lttng_home, "trace")
 
         # Make application using the ust runtime
-        shutil.copytree(Settings.apps_gen_events_folder, app_path)
-        runtime_app.run("make V=1", cwd=app_path)
+        runtime_app.build_app(Settings.apps_gen_events_folder, app_path)
 
         # Start lttng-sessiond
         sessiond = utils.sessiond_spawn(runtime_tools)
@@ -275,8 +273,7 @@ def test_ust_app_regen_statedump(tmpdir, ust_label, tools_label, success):
         trace_path = os.path.join(runtime_tools.lttng_home, "trace")
 
         # Make application using the ust runtime
-        shutil.copytree(Settings.apps_gen_events_folder, app_path)
-        runtime_app.run("make V=1", cwd=app_path)
+        runtime_app.build_app(Settings.apps_gen_events_folder, app_path)
 
         # Start lttng-sessiond
         sessiond = utils.sessiond_spawn(runtime_tools)
@@ -291,9 +288,9 @@ def test_ust_app_regen_statedump(tmpdir, ust_label, tools_label, success):
 
         # Run application
         cmd = "./app {} 0 {} {}".format(nb_events, app_sync_start, app_sync_end)
-        runtime_app.spawn_subprocess(cmd, cwd=app_path)
+        app = runtime_app.spawn_subprocess(cmd, cwd=app_path)
 
-        utils.wait_for_file(app_sync_start)
+        runtime_app.wait_for_file(app_sync_start, app)
 
         if not success:
             with pytest.raises(subprocess.CalledProcessError):
@@ -349,8 +346,7 @@ def test_ust_app_starglobing_enabler(tmpdir, ust_label, tools_label, scenario):
         trace_path = os.path.join(runtime_tools.lttng_home, "trace")
 
         # Make application using the ust runtime
-        shutil.copytree(Settings.apps_gen_events_folder, app_path)
-        runtime_app.run("make V=1", cwd=app_path)
+        runtime_app.build_app(Settings.apps_gen_events_folder, app_path)
 
         # Start lttng-sessiond
         sessiond = utils.sessiond_spawn(runtime_tools)
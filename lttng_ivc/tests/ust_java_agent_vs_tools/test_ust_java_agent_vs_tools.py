@@ -20,7 +20,6 @@
 
 import pytest
 import os
-import shutil
 import signal
 import subprocess
 
@@ -210,11 +209,10 @@ def test_ust_java_agent_tracing_available(
         trace_path = os.path.join(runtime_tools.lttng_home, "trace")
 
         # Make application using the ust runtime
-        shutil.copytree(version_to_app[app_version], app_path)
-        runtime_app.run("javac App.java", cwd=app_path)
+        runtime_app.build_java_app(version_to_app[app_version], app_path)
 
         # Start lttng-sessiond
-        sessiond = utils.sessiond_spawn(runtime_tools)
+        sessiond = utils.sessiond_spawn(runtime_tools, wait_for_agent=True)
 
         # Create session using mi to get path and session name
         runtime_tools.run("lttng create trace --output={}".format(trace_path))
@@ -275,11 +273,10 @@ def test_ust_java_agent_interface(tmpdir, ust_label, tools_label, app_version, o
         trace_path = os.path.join(runtime_tools.lttng_home, "trace")
 
         # Make application using the ust runtime
-        shutil.copytree(version_to_app[app_version], app_path)
-        runtime_app.run("javac App.java", cwd=app_path)
+        runtime_app.build_java_app(version_to_app[app_version], app_path)
 
         # Start lttng-sessiond
-        sessiond = utils.sessiond_spawn(runtime_tools)
+        sessiond = utils.sessiond_spawn(runtime_tools, wait_for_agent=True)
 
         # Create session using mi to get path and session name
         runtime_tools.run("lttng create trace --output={}".format(trace_path))
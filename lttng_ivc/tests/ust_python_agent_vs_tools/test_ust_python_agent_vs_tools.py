@@ -235,7 +235,7 @@ def test_ust_python_agent_tracing_available(
         shutil.copytree(Settings.apps_python, app_path)
 
         # Start lttng-sessiond
-        sessiond = utils.sessiond_spawn(runtime_tools)
+        sessiond = utils.sessiond_spawn(runtime_tools, wait_for_agent=True)
 
         # Create session using mi to get path and session name
         runtime_tools.run("lttng create trace --output={}".format(trace_path))
@@ -299,7 +299,7 @@ def test_ust_python_agent_interface(tmpdir, ust_label, tools_label, outcome):
         shutil.copytree(Settings.apps_python, app_path)
 
         # Start lttng-sessiond
-        sessiond = utils.sessiond_spawn(runtime_tools)
+        sessiond = utils.sessiond_spawn(runtime_tools, wait_for_agent=True)
 
         # Create session using mi to get path and session name
         runtime_tools.run("lttng create trace --output={}".format(trace_path))
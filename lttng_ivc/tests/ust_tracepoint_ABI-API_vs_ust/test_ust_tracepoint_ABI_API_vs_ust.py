@@ -227,18 +227,22 @@ def test_ust_tracepoint_abi_api_vs_ust_enum(tmpdir, ust_label, tools_label, scen
         # Use the testing tool runtime to make the probe
         if scenario == fail_provider:
             with pytest.raises(subprocess.CalledProcessError):
-                runtime_tools.run("make provider-enum", cwd=app_path)
+                runtime_tools.build_app(Settings.apps_preload_provider_folder, app_path,
+                                        "provider-enum", fresh=True)
             return
         else:
-            runtime_tools.run("make provider-enum", cwd=app_path)
+            runtime_tools.build_app(Settings.apps_preload_provider_folder, app_path,
+                                    "provider-enum")
 
         # Use the ust env to test tracepoint instrumentation
         if scenario == fail_app:
             with pytest.raises(subprocess.CalledProcessError):
-                runtime_app.run("make app-enum", cwd=app_path)
+                runtime_app.build_app(Settings.apps_preload_provider_folder, app_path,
+                                      "app-enum", fresh=True)
             return
         else:
-            runtime_app.run("make app-enum", cwd=app_path)
+            runtime_app.build_app(Settings.apps_preload_provider_folder, app_path,
+                                  "app-enum")
 
         # Start lttng-sessiond
         sessiond = utils.sessiond_spawn(runtime_tools)
@@ -301,10 +305,12 @@ def test_ust_tracepoint_abi_api_vs_ust_base(tmpdir, ust_label, tools_label, scen
         shutil.copytree(Settings.apps_preload_provider_folder, app_path)
 
         # Make the probe provider in the tools runtime
-        runtime_tools.run("make provider", cwd=app_path)
+        runtime_tools.build_app(Settings.apps_preload_provider_folder, app_path,
+                                "provider")
 
         # Use the ust env to test tracepoint instrumentation
-        runtime_app.run("make app", cwd=app_path)
+        runtime_app.build_app(Settings.apps_preload_provider_folder, app_path,
+                              "app")
 
         # Start lttng-sessiond
         sessiond = utils.sessiond_spawn(runtime_tools)
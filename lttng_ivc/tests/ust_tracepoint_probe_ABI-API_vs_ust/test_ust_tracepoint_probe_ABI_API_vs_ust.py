@@ -231,13 +231,16 @@ def test_ust_tracepoint_probe_abi_api_vs_ust_enum(
         # Make the probe using the ust runtime
         if scenario == fail_provider:
             with pytest.raises(subprocess.CalledProcessError):
-                runtime_ust.run("make provider-enum", cwd=app_path)
+                runtime_ust.build_app(Settings.apps_preload_provider_folder, app_path,
+                                      "provider-enum", fresh=True)
             return
         else:
-            runtime_ust.run("make provider-enum", cwd=app_path)
+            runtime_ust.build_app(Settings.apps_preload_provider_folder, app_path,
+                                  "provider-enum")
 
         # Make the application using the ust runtime
-        runtime_ust.run("make app-enum", cwd=app_path)
+        runtime_ust.build_app(Settings.apps_preload_provider_folder, app_path,
+                              "app-enum")
 
         # Start lttng-sessiond.
         sessiond = utils.sessiond_spawn(runtime_tools)
@@ -309,10 +312,12 @@ def test_ust_tracepoint_probe_abi_api_vs_ust_base(
         shutil.copytree(Settings.apps_preload_provider_folder, app_path)
 
         # Make the probe in the ust runtime
-        runtime_ust.run("make provider", cwd=app_path)
+        runtime_ust.build_app(Settings.apps_preload_provider_folder, app_path,
+                              "provider")
 
         # Use the ust env to test tracepoint instrumentation
-        runtime_ust.run("make app", cwd=app_path)
+        runtime_ust.build_app(Settings.apps_preload_provider_folder, app_path,
+                              "app")
 
         # Start lttng-sessiond
         sessiond = utils.sessiond_spawn(runtime_tools)
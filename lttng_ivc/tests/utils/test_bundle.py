@@ -0,0 +1,110 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+
+import pytest
+
+import lttng_ivc.utils.bundle as Bundle
+
+"""
+Export, import and relocation of precooked project bundles.
+"""
+
+key = "0" * 64
+
+
+def make_entry(root):
+    entry = os.path.join(root, key)
+    os.makedirs(os.path.join(entry, "source", ".git"))
+    with open(os.path.join(entry, "source", ".git", "HEAD"), 'w') as f:
+        f.write("ref: refs/heads/master\n")
+    with open(os.path.join(entry, "source", "configure"), 'w') as f:
+        f.write("#!/bin/sh\n")
+    return entry
+
+
+def test_pack_unpack(tmpdir):
+    entry = make_entry(str(tmpdir.join("cache")))
+    folder = str(tmpdir.join("bundles"))
+    metadata = {"label": "urcu-0.12"}
+
+    assert not Bundle.is_published(folder, key)
+    archive = Bundle.pack(entry, folder, key, metadata)
+    assert archive == Bundle.get_archive_path(folder, key)
+    assert Bundle.is_published(folder, key)
+    # Only the archive and its checksum, no leftover temporary file
+    assert sorted(os.listdir(folder)) == [key + ".tar.gz", key + ".tar.gz.sha256"]
+
+    destination = str(tmpdir.mkdir("imported"))
+    assert Bundle.unpack(folder, key, destination) == metadata
+    imported = os.path.join(destination, key)
+    assert os.path.isfile(os.path.join(imported, "source", "configure"))
+    assert not os.path.exists(os.path.join(imported, "source", ".git"))
+
+
+def test_unpack_checksum_mismatch(tmpdir):
+    entry = make_entry(str(tmpdir.join("cache")))
+    folder = str(tmpdir.join("bundles"))
+    archive = Bundle.pack(entry, folder, key, {})
+    with open(archive, 'ab') as f:
+        f.write(b"corrupted")
+    with pytest.raises(Exception, match="Checksum mismatch"):
+        Bundle.unpack(folder, key, str(tmpdir.mkdir("imported")))
+
+
+def test_relocate_text(tmpdir):
+    path = tmpdir.join("liblttng-ust.la")
+    path.write("libdir='/old/prefix/install/lib'\n")
+    Bundle.relocate_tree(str(tmpdir), "/old/prefix", "/new/longer/prefix")
+    assert path.read() == "libdir='/new/longer/prefix/install/lib'\n"
+
+
+def test_relocate_binary(tmpdir):
+    path = tmpdir.join("lttng-sessiond")
+    data = (b"\x7fELF\0\0" + b"/old/prefix/install/lib:/old/prefix/lib\0" +
+            b"other\0/old/prefix\0")
+    path.write_binary(data)
+    Bundle.relocate_tree(str(tmpdir), "/old/prefix", "/new")
+    relocated = path.read_binary()
+    # Offsets are kept, the shrunk strings are NUL padded
+    assert len(relocated) == len(data)
+    strings = relocated.split(b"\0")
+    assert b"/new/install/lib:/new/lib" in strings
+    assert b"other" in strings
+    assert b"/new" in strings
+    assert relocated.index(b"other") == data.index(b"other")
+    assert b"/old" not in relocated
+
+
+def test_relocate_binary_longer_prefix(tmpdir):
+    tmpdir.join("lib.so").write_binary(b"\x7fELF\0/old\0")
+    with pytest.raises(Exception, match="new prefix is longer"):
+        Bundle.relocate_tree(str(tmpdir), "/old", "/new/longer")
+
+
+def test_relocate_symlink(tmpdir):
+    link = tmpdir.join("babeltrace")
+    os.symlink("/old/prefix/install/bin/babeltrace2", str(link))
+    os.symlink("babeltrace2", str(tmpdir.join("relative")))
+    Bundle.relocate_tree(str(tmpdir), "/old/prefix", "/new/prefix")
+    assert os.readlink(str(link)) == "/new/prefix/install/bin/babeltrace2"
+    assert os.readlink(str(tmpdir.join("relative"))) == "babeltrace2"
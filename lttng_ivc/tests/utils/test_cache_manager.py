@@ -0,0 +1,112 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import fcntl
+
+import pytest
+
+import lttng_ivc.utils.cache_manager as CacheManager
+
+"""
+Least recently used eviction of the projects and bootstrap caches.
+"""
+
+
+def make_entry(folder, index, atime):
+    key = "{:064x}".format(index)
+    path = os.path.join(folder, key)
+    os.makedirs(path)
+    with open(os.path.join(path, "manifest"), 'w') as f:
+        f.write("manifest")
+    with open(os.path.join(path, "data"), 'wb') as f:
+        f.write(b"x" * 8192)
+    CacheManager.record_entry(folder, key)
+    os.utime(os.path.join(folder, key + ".lock"), (atime, atime))
+    return key
+
+
+def test_parse_size():
+    assert CacheManager.parse_size("512") == 512
+    assert CacheManager.parse_size("4K") == 4096
+    assert CacheManager.parse_size("20G") == 20 * 1024 ** 3
+    assert CacheManager.parse_size("1MiB") == 1024 ** 2
+    with pytest.raises(Exception):
+        CacheManager.parse_size("lots")
+
+
+def test_tree_size_hard_links(tmpdir):
+    tmpdir.join("a").write_binary(b"x" * 8192)
+    size = CacheManager.get_tree_size(str(tmpdir))
+    os.link(str(tmpdir.join("a")), str(tmpdir.join("b")))
+    assert CacheManager.get_tree_size(str(tmpdir)) == size
+
+
+def test_collect_lru(tmpdir):
+    folder = str(tmpdir)
+    keys = [make_entry(folder, i, 1000 + i) for i in range(4)]
+    # Not an entry
+    tmpdir.mkdir("tmp")
+    size = CacheManager.get_entries(folder)[0][1]
+
+    reclaimed = CacheManager.collect(folder, 2 * size)
+    assert reclaimed == 2 * size
+    remaining = sorted(key for atime, size, key in CacheManager.get_entries(folder))
+    assert remaining == keys[2:]
+    assert os.path.isdir(str(tmpdir.join("tmp")))
+    # Lock files are kept
+    assert os.path.exists(os.path.join(folder, keys[0] + ".lock"))
+
+
+def test_collect_touch(tmpdir):
+    folder = str(tmpdir)
+    keys = [make_entry(folder, i, 1000 + i) for i in range(2)]
+    size = CacheManager.get_entries(folder)[0][1]
+    CacheManager.touch_entry(folder, keys[0])
+    CacheManager.collect(folder, size)
+    assert [key for atime, size, key in CacheManager.get_entries(folder)] == keys[:1]
+
+
+def test_collect_locked(tmpdir):
+    folder = str(tmpdir)
+    keys = [make_entry(folder, i, 1000 + i) for i in range(3)]
+    size = CacheManager.get_entries(folder)[0][1]
+
+    # An entry in use by a test or being built holds its lock
+    with open(os.path.join(folder, keys[0] + ".lock"), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH)
+        reclaimed = CacheManager.collect(folder, 0)
+        assert reclaimed == 2 * size
+        assert os.path.exists(os.path.join(folder, keys[0], "manifest"))
+        assert not os.path.exists(os.path.join(folder, keys[1]))
+        assert not os.path.exists(os.path.join(folder, keys[2]))
+
+
+def test_collect_files(tmpdir):
+    for i in range(4):
+        path = tmpdir.join("{}.tar".format(i))
+        path.write_binary(b"x" * 8192)
+        os.utime(str(path), (i, i))
+    tmpdir.join("5.tar.tmp").write_binary(b"x" * 65536)
+    size = os.stat(str(tmpdir.join("0.tar"))).st_blocks * 512
+
+    assert CacheManager.collect_files(str(tmpdir), 2 * size, ".tar") == 2 * size
+    assert sorted(os.listdir(str(tmpdir))) == ["2.tar", "3.tar", "5.tar.tmp"]
@@ -0,0 +1,94 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import lttng_ivc.utils.planner as Planner
+
+"""
+Incremental rebuild plans from run configuration changes.
+"""
+
+
+def marker(project, sha1, deps=[]):
+    return {"project": project, "sha1": sha1, "url": "url", "path": "path",
+            "deps": list(deps)}
+
+
+previous = {
+    "urcu-0.12": marker("urcu", "a"),
+    "lttng-ust-2.13": marker("lttng-ust", "b", ["urcu-0.12"]),
+    "lttng-tools-2.13": marker("lttng-tools", "c", ["lttng-ust-2.13", "urcu-0.12"]),
+    "lttng-modules-2.13": marker("lttng-modules", "d"),
+}
+targets = set(previous)
+
+
+def test_get_dependents():
+    graph = {label: m["deps"] for label, m in previous.items()}
+    dependents = Planner.get_dependents(graph)
+    assert sorted(dependents["urcu-0.12"]) == ["lttng-tools-2.13", "lttng-ust-2.13"]
+    assert dependents["lttng-ust-2.13"] == ["lttng-tools-2.13"]
+    assert dependents["lttng-tools-2.13"] == []
+
+
+def test_plan_unchanged():
+    assert Planner.plan(previous, previous, targets) == {}
+
+
+def test_plan_leaf_changed():
+    current = dict(previous)
+    current["lttng-tools-2.13"] = marker("lttng-tools", "c2", ["lttng-ust-2.13", "urcu-0.12"])
+    assert set(Planner.plan(previous, current, targets)) == {"lttng-tools-2.13"}
+
+
+def test_plan_dependents_rebuilt():
+    current = dict(previous)
+    current["urcu-0.12"] = marker("urcu", "a2")
+    reasons = Planner.plan(previous, current, targets)
+    assert set(reasons) == {"urcu-0.12", "lttng-ust-2.13", "lttng-tools-2.13"}
+    assert reasons["urcu-0.12"] == "sha1 changed"
+
+
+def test_plan_new_and_not_cached():
+    current = dict(previous)
+    current["babeltrace-2.0"] = marker("babeltrace", "e")
+    reasons = Planner.plan(previous, current, set(current),
+                           is_cached=lambda label: label != "lttng-ust-2.13")
+    assert reasons == {
+        "babeltrace-2.0": "new marker",
+        "lttng-ust-2.13": "not cached",
+        "lttng-tools-2.13": "dependency lttng-ust-2.13 rebuilt",
+    }
+
+
+def test_plan_only_targets():
+    # Markers outside of the targets and their dependencies are left out
+    current = dict(previous)
+    current["lttng-modules-2.13"] = marker("lttng-modules", "d2")
+    current["urcu-0.12"] = marker("urcu", "a2")
+    reasons = Planner.plan(previous, current, {"lttng-ust-2.13"})
+    assert set(reasons) == {"urcu-0.12", "lttng-ust-2.13"}
+
+
+def test_markers_round_trip(tmpdir):
+    path = str(tmpdir.join("run_configuration.yaml"))
+    assert Planner.load_markers(path) == {}
+    Planner.save_markers(path, previous)
+    assert Planner.load_markers(path) == previous
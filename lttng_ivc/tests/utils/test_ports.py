@@ -0,0 +1,109 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import fcntl
+import socket
+
+import pytest
+
+import lttng_ivc.settings as Settings
+import lttng_ivc.utils.ports as Ports
+
+"""
+Reservation of daemon ports per pytest-xdist worker.
+"""
+
+
+@pytest.fixture
+def port_range(tmpdir, monkeypatch):
+    monkeypatch.setattr(Settings, "ports_folder", str(tmpdir.join("ports")))
+    monkeypatch.setattr(Settings, "ports_range_start", 21000)
+    monkeypatch.setattr(Ports, "get_ephemeral_start", lambda: 21032)
+    monkeypatch.setattr(Ports, "_next_port", None)
+    monkeypatch.delenv("PYTEST_XDIST_WORKER", raising=False)
+    monkeypatch.delenv("PYTEST_XDIST_WORKER_COUNT", raising=False)
+    return (21000, 21032)
+
+
+def test_worker_ranges(port_range, monkeypatch):
+    assert Ports.get_worker_range() == port_range
+
+    monkeypatch.setenv("PYTEST_XDIST_WORKER_COUNT", "4")
+    ranges = []
+    for worker in range(4):
+        monkeypatch.setenv("PYTEST_XDIST_WORKER", "gw{}".format(worker))
+        ranges.append(Ports.get_worker_range())
+    assert ranges == [(21000, 21008), (21008, 21016),
+                      (21016, 21024), (21024, 21032)]
+
+    monkeypatch.setenv("PYTEST_XDIST_WORKER_COUNT", "64")
+    with pytest.raises(Exception, match="No port left"):
+        Ports.get_worker_range()
+
+
+def test_reserve_distinct(port_range):
+    start, end = port_range
+    with Ports.reserve(3) as first, Ports.reserve(2) as second:
+        ports = first.ports + second.ports
+        assert len(set(ports)) == 5
+        assert all(start <= port < end for port in ports)
+
+
+def test_reserve_held_by_another_process(port_range):
+    start, end = port_range
+    os.makedirs(Settings.ports_folder)
+    # A concurrent run holds the lock of the first port
+    with open(os.path.join(Settings.ports_folder, "{}.lock".format(start)), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        with Ports.reserve() as reservation:
+            assert reservation.ports != [start]
+
+
+def test_reserve_skip_bound(port_range):
+    start, end = port_range
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('', start))
+        s.listen()
+        with Ports.reserve() as reservation:
+            assert reservation.ports != [start]
+
+
+def _available(start, end):
+    # Ports in use on the host are skipped
+    return sum(1 for port in range(start, end) if Ports._is_bindable(port))
+
+
+def test_reserve_exhausted(port_range):
+    available = _available(*port_range)
+    with Ports.reserve(available - 1):
+        with pytest.raises(Exception, match="No free port left"):
+            Ports.reserve(2)
+        # A failed reservation does not hold on its ports
+        Ports.reserve(1).release()
+
+
+def test_release(port_range):
+    reservation = Ports.reserve(_available(*port_range))
+    with pytest.raises(Exception, match="No free port left"):
+        Ports.reserve()
+    reservation.release()
+    Ports.reserve().release()
@@ -0,0 +1,95 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+
+import pytest
+from git import Repo
+
+import lttng_ivc.utils.remote as Remote
+
+"""
+Incremental fetch of the remotes, a local bare repository stands in for the
+remote.
+"""
+
+
+@pytest.fixture
+def upstream(tmpdir, monkeypatch):
+    for var in ["GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"]:
+        monkeypatch.setenv(var, "lttng-ivc")
+    for var in ["GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"]:
+        monkeypatch.setenv(var, "lttng-ivc@localhost")
+
+    bare_path = str(tmpdir.join("remote.git"))
+    Repo.init(bare_path, bare=True)
+    work = Repo.init(str(tmpdir.join("work")))
+    work.git.checkout("-b", "stable-2.13")
+
+    def commit(message):
+        path = os.path.join(work.working_tree_dir, "file")
+        with open(path, 'a') as f:
+            f.write(message + "\n")
+        work.index.add([path])
+        commit = work.index.commit(message)
+        work.git.push(bare_path, "stable-2.13", "--tags")
+        return commit.hexsha
+
+    sha1 = commit("first")
+    work.create_tag("v2.13.0")
+    work.create_tag("v2.13.1", message="annotated")
+    work.git.push(bare_path, "--tags")
+    return bare_path, sha1, commit
+
+
+refs = ["stable-2.13", "v2.13.0", "v2.13.1"]
+
+
+def test_up_to_date_after_fetch(tmpdir, upstream):
+    url, sha1, commit = upstream
+    local = Repo.clone_from(url, str(tmpdir.join("local")))
+    assert Remote.is_up_to_date(local, url, refs)
+    assert Remote.is_up_to_date(local, url, [sha1])
+
+    commit("second")
+    assert not Remote.is_up_to_date(local, url, refs)
+    # Tags did not move
+    assert Remote.is_up_to_date(local, url, ["v2.13.0", "v2.13.1"])
+
+    local.remote().fetch()
+    assert Remote.is_up_to_date(local, url, refs)
+
+
+def test_update_remote(tmpdir, upstream):
+    url, sha1, commit = upstream
+    path = str(tmpdir.join("local"))
+    Remote.update_remote(url, path, refs)
+    new_sha1 = commit("second")
+    Remote.update_remote(url, path, refs)
+
+    resolved = Remote.resolve_refs(Repo(path), refs + [sha1, "unknown"])
+    assert resolved == {
+        "stable-2.13": new_sha1,
+        "v2.13.0": sha1,
+        # Peeled annotated tag
+        "v2.13.1": sha1,
+        sha1: sha1,
+    }
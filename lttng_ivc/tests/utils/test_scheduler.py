@@ -0,0 +1,89 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import threading
+
+import pytest
+
+import lttng_ivc.utils.scheduler as Scheduler
+
+"""
+Build scheduling of labels following their dependency graph.
+"""
+
+graph = {
+    "urcu": [],
+    "babeltrace": [],
+    "ust": ["urcu"],
+    "tools": ["ust", "urcu"],
+    "modules": [],
+}
+
+
+def test_dependency_closure():
+    assert Scheduler.dependency_closure(graph, ["tools"]) == {"tools", "ust", "urcu"}
+    assert Scheduler.dependency_closure(graph, []) == set()
+
+
+@pytest.mark.parametrize("workers", [1, 2, 8])
+def test_schedule_dependency_order(workers):
+    lock = threading.Lock()
+    order = []
+
+    def build(label):
+        with lock:
+            assert all(dep in order for dep in graph[label])
+            order.append(label)
+
+    failed = Scheduler.schedule(graph, ["tools", "modules"], build, workers=workers)
+    assert failed == set()
+    assert sorted(order) == ["modules", "tools", "urcu", "ust"]
+
+
+def test_schedule_concurrent():
+    # Independent labels must run at the same time, each one waits for the
+    # other to start.
+    barrier = threading.Barrier(2, timeout=10)
+
+    def build(label):
+        barrier.wait()
+
+    failed = Scheduler.schedule(graph, ["urcu", "babeltrace"], build, workers=2)
+    assert failed == set()
+
+
+def test_schedule_failed_dependency():
+    built = []
+
+    def build(label):
+        if label == "urcu":
+            raise Exception("Build failed")
+        built.append(label)
+
+    failed = Scheduler.schedule(graph, ["tools", "modules"], build, workers=2)
+    assert failed == {"urcu", "ust", "tools"}
+    assert built == ["modules"]
+
+
+def test_schedule_cycle():
+    cycle = {"a": ["b"], "b": ["a"]}
+    with pytest.raises(Exception, match="Dependency cycle"):
+        Scheduler.schedule(cycle, ["a"], lambda label: None, workers=2)
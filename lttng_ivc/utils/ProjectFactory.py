@@ -19,14 +19,20 @@
 # SOFTWARE.
 
 import os
+import copy
+import fcntl
 import logging
+import threading
+import hashlib
+import json
 import yaml
-import pickle
 
 import lttng_ivc.utils.project as Project
+import lttng_ivc.utils.bundle as Bundle
+import lttng_ivc.utils.cache_manager as CacheManager
 import lttng_ivc.settings as Settings
 
-from lttng_ivc.utils.utils import sha256_checksum
+from lttng_ivc.utils.utils import get_compiler_version
 
 _logger = logging.getLogger('project.factory')
 _project_constructor = {
@@ -37,9 +43,29 @@ _project_constructor = {
         'urcu': Project.Urcu,
 }
 
-__projects_cache = {}
+# Validated precooked projects of this process. Build key to a tuple of
+# (manifest mtime, project). Labels of identical build keys share the entry,
+# callers get a copy bearing their label.
+_precook_cache = {}
 
-_project_py_checksum = sha256_checksum(Settings.project_py_file_location)
+# Environment variables influencing the build of a project
+_build_env_variables = ["CC", "CXX", "CFLAGS", "CPPFLAGS", "LDFLAGS",
+                        "PKG_CONFIG_PATH", "LD_LIBRARY_PATH"]
+
+_build_keys = {}
+
+# Lock files of the cache entries used by this process, by build key, along
+# with a lock serializing the threads of this process. A shared lock is held
+# on the entry for the lifetime of the process once loaded so that it is not
+# rebuilt or evicted while in use. Building or importing the entry requires an
+# exclusive lock.
+_precook_locks = {}
+_precook_locks_guard = threading.Lock()
+
+_manifest_version = 1
+# Fields of a manifest holding paths of the cache entry
+_manifest_paths = ['basedir', 'log_path', 'source_path', 'installation_path',
+                   'mi_xsd']
 
 _markers = None
 with open(Settings.run_configuration_file, 'r') as stream:
@@ -49,6 +75,11 @@ with open(Settings.run_configuration_file, 'r') as stream:
 
 
 def get_fresh(label, tmpdir):
+    """
+    Return a mutable project of label in tmpdir. When the label is already
+    precooked its trees are cloned instead of checked out and bootstrapped,
+    the project still needs to be built.
+    """
     if label not in _markers:
         # TODO: specialized exception, handle it caller-side so the caller
         # can decide to skip or fail test.
@@ -59,7 +90,11 @@ def get_fresh(label, tmpdir):
     sha1 = marker['sha1']
     deps = marker['deps']
 
-    project = constructor(label, path, sha1, tmpdir)
+    precook = None
+    if is_precooked(label):
+        precook = get_precook(label)
+
+    project = constructor(label, path, sha1, tmpdir, precook=precook)
 
     for dep in deps:
         obj_dep = get_precook(dep)
@@ -69,42 +104,148 @@ def get_fresh(label, tmpdir):
 
     return project
 
-def _validate_pickle(pickle, label):
-    _logger.info("Checking validate for {} {}".format(pickle,
-                                                       label))
-    if pickle._py_file_checksum != _project_py_checksum:
-        _logger.warn("Project py file changed".format(pickle.label,
-                                                      label))
-        return False
+def get_build_key(label):
+    """
+    Return the key identifying the build of a precooked project. It covers
+    everything influencing the resulting installation: the source sha1, the
+    key of the dependencies, the configure flags, the toolchain and build
+    environment, and the build recipe of the project class.
+    """
+    if label in _build_keys:
+        return _build_keys[label]
+
+    if label not in _markers:
+        raise Exception('Label is no present')
+    marker = _markers[label]
+    constructor = _project_constructor[marker['project']]
+
+    inputs = {
+            'project': marker['project'],
+            'sha1': marker['sha1'],
+            'deps': [get_build_key(dep) for dep in marker['deps']],
+            'configure_flags': constructor.get_default_configure_flags(),
+            'compiler': get_compiler_version(),
+            'env': [(var, os.environ.get(var)) for var in _build_env_variables],
+            'recipe': constructor.get_recipe_checksum(),
+    }
+    key = hashlib.sha256(repr(sorted(inputs.items())).encode('utf8')).hexdigest()
+    _logger.debug("Build key for {}: {} inputs: {}".format(label, key, inputs))
+
+    _build_keys[label] = key
+    return key
+
+
+def _get_cache_path(label):
+    return os.path.join(Settings.projects_cache_folder, get_build_key(label))
+
+
+def _get_manifest_path(label):
+    return os.path.join(_get_cache_path(label), "manifest")
+
+
+def _get_precook_lock(key):
+    with _precook_locks_guard:
+        if key not in _precook_locks:
+            os.makedirs(Settings.projects_cache_folder, exist_ok=True)
+            lock_path = os.path.join(Settings.projects_cache_folder,
+                                     key + ".lock")
+            _precook_locks[key] = (threading.Lock(), open(lock_path, 'a'))
+        return _precook_locks[key]
 
-    if pickle.label != label:
-        _logger.warn("Label  {} and {} are not the same".format(pickle.label,
-                                                                label))
-        return False
-    if pickle.sha1 != _markers[label]['sha1']:
-        _logger.warn("Sha1  {} and {} are not the same".format(pickle.sha1,
-            _markers[label]['sha1']))
-        return False
 
-    deps = _markers[label]['deps']
-    if len(deps) != len(pickle.dependencies):
-        _logger.warn("Len {} and {} are not the same".format(len(deps),
-            len(pickle.dependencies)))
+def _get_memoized_precook(label, key, manifest_path):
+    if key not in _precook_cache:
+        return None
+    cached_mtime, project = _precook_cache[key]
+    try:
+        mtime = os.stat(manifest_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if cached_mtime != mtime:
+        return None
+    return _copy_precook(project, label)
+
+
+def _memoize_precook(key, manifest_path, project):
+    mtime = os.stat(manifest_path).st_mtime_ns
+    _precook_cache[key] = (mtime, project)
+
+
+def _copy_precook(project, label):
+    """
+    Return a copy of a memoized precooked project labeled label. Its
+    special environment variables and dependencies, copied as well, can be
+    modified without affecting the other users of the precook.
+    """
+    project = copy.copy(project)
+    project.label = label
+    project.special_env_variables = dict(project.special_env_variables)
+    project.custom_configure_flags = list(project.custom_configure_flags)
+    project.dependencies = {name: _copy_precook(dep, dep.label)
+                            for name, dep in project.dependencies.items()}
+    return project
+
+
+def _write_manifest(manifest_path, key, manifest):
+    """
+    Write a manifest made of a one line header identifying the format and the
+    build key followed by the json description of the project. The manifest
+    is replaced atomically.
+    """
+    tmp_path = "{}.{}".format(manifest_path, os.getpid())
+    with open(tmp_path, 'w') as manifest_file:
+        manifest_file.write("lttng-ivc-manifest {} {}\n".format(
+            _manifest_version, key))
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def _read_manifest(manifest_path):
+    with open(manifest_path, 'r') as manifest_file:
+        manifest_file.readline()
+        return json.load(manifest_file)
+
+
+def _validate_manifest(manifest_path, label):
+    """
+    Validate the manifest header against the build key of the label.
+    """
+    with open(manifest_path, 'r') as manifest_file:
+        header = manifest_file.readline().split()
+    key = get_build_key(label)
+    expected = ["lttng-ivc-manifest", str(_manifest_version), key]
+    if header != expected:
+        _logger.warn("Manifest header {} and {} are not the same".format(
+            header, expected))
         return False
-    for dep in deps:
-        project_name = _markers[dep]['project']
-        if project_name not in pickle.dependencies:
-            _logger.warn("Dep project {} with label {} is not in {}".format(project_name,dep, pickle.dependencies))
-            return False
-        else:
-            _logger.info("Calling validate {} {}".format(pickle.dependencies[project_name],
-                dep))
-            valid = _validate_pickle(pickle.dependencies[project_name], dep)
-            if not valid:
-                return False
     return True
 
 
+def _relocate_manifest(manifest_path, old_prefix, new_prefix):
+    with open(manifest_path, 'r') as manifest_file:
+        header = manifest_file.readline()
+        manifest = json.load(manifest_file)
+
+    for field in _manifest_paths:
+        if manifest.get(field) is not None:
+            manifest[field] = manifest[field].replace(old_prefix, new_prefix)
+    for var, value in manifest['special_env_variables'].items():
+        manifest['special_env_variables'][var] = value.replace(old_prefix,
+                                                               new_prefix)
+
+    _write_manifest(manifest_path, header.split()[2], manifest)
+
+
+def is_precooked(label):
+    """
+    Check if a valid precooked project is present in the cache for label.
+    """
+    manifest_path = _get_manifest_path(label)
+    if not os.path.exists(manifest_path):
+        return False
+    return _validate_manifest(manifest_path, label)
+
+
 def get_precook(label):
     """
     Retrieve a precooked immutable projects from a cache if present
@@ -116,35 +257,170 @@ def get_precook(label):
         raise Exception('Label is no present')
     marker = _markers[label]
     constructor = _project_constructor[marker['project']]
-    path = marker['path']
-    sha1 = marker['sha1']
     deps = marker['deps']
 
-    # Cache path for the label
-    cache_path = os.path.join(Settings.projects_cache_folder, label)
-    pickle_path = os.path.join(cache_path, label+".pickle")
-
-    # Check if Pickle Rick is present and valid. If so return it asap.
-    if os.path.exists(pickle_path):
-        with open(pickle_path, 'rb') as pickle_file:
-            pickled = pickle.load(pickle_file)
-        if _validate_pickle(pickled, label):
-            return pickled
-        else:
-            pickled.cleanup()
-            _logger.warn("Pickle for {} is invalid. Rebuilding".format(label))
+    # Cache entries are addressed by build key. Entries of previous keys are
+    # left in place so that identical inputs can reuse them later on.
+    key = get_build_key(label)
+    manifest_path = _get_manifest_path(label)
 
-    project = constructor(label, path, sha1, cache_path)
+    project = _get_memoized_precook(label, key, manifest_path)
+    if project is not None:
+        return project
 
+    # Dependencies are shared through the precook cache, not duplicated.
+    dependencies = {}
     for dep in deps:
-        obj_dep = get_precook(dep)
         project_name = _markers[dep]['project']
+        dependencies[project_name] = get_precook(dep)
+
+    thread_lock, lock_file = _get_precook_lock(key)
+    with thread_lock:
+        project = _get_memoized_precook(label, key, manifest_path)
+        if project is not None:
+            return project
+
+        fcntl.flock(lock_file, fcntl.LOCK_SH)
+        if not is_precooked(label):
+            # Wait for any build in progress, the conversion is not atomic
+            # hence the check once the exclusive lock is held.
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            published = False
+            try:
+                if not is_precooked(label):
+                    _publish_precook(label, dependencies)
+                published = True
+            finally:
+                # Do not hold on a failed entry
+                fcntl.flock(lock_file,
+                            fcntl.LOCK_SH if published else fcntl.LOCK_UN)
+
+        project = constructor.from_manifest(_read_manifest(manifest_path),
+                                            dependencies)
+        project._build_key = key
+        CacheManager.touch_entry(Settings.projects_cache_folder, key)
+        _memoize_precook(key, manifest_path, project)
+
+    # The same inputs might have been built under another label
+    return _copy_precook(project, label)
+
+
+def _publish_precook(label, dependencies):
+    """
+    Import or build the precooked project of label and publish it by writing
+    its manifest. The exclusive lock of the entry must be held.
+
+    The installation prefix ends up in the installed files, the entry is thus
+    built in place rather than in a temporary folder. The manifest is written
+    atomically last, an entry without manifest is never used and is discarded
+    by the next build.
+    """
+    if (Settings.precook_bundle_folder is not None and
+            _import_bundle(label, Settings.precook_bundle_folder)):
+        collect_garbage()
+        return
+
+    marker = _markers[label]
+    constructor = _project_constructor[marker['project']]
+    key = get_build_key(label)
+    project = constructor(label, marker['path'], marker['sha1'],
+                          _get_cache_path(label))
+
+    for project_name, obj_dep in dependencies.items():
         project.dependencies[project_name] = obj_dep
-        _logger.info("Added dep project {}, label {} to project labeled {}".format(project_name, dep, label))
+        _logger.info("Added dep project {}, label {} to project labeled {}".format(project_name, obj_dep.label, label))
 
     project.autobuild()
+    project._build_key = key
     project._immutable = True
-    with open(pickle_path, 'wb') as pickle_file:
-        pickle.dump(project, pickle_file)
+    _write_manifest(_get_manifest_path(label), key, project.to_manifest())
+    CacheManager.record_entry(Settings.projects_cache_folder, key)
+    collect_garbage()
 
-    return project
+
+def collect_garbage(budget=None):
+    """
+    Evict least recently used precooked projects not in use until the cache
+    fits in budget bytes, defaults to the configured budget. Return the number
+    of bytes reclaimed.
+    """
+    if budget is None:
+        if Settings.projects_cache_budget is None:
+            return 0
+        budget = CacheManager.parse_size(Settings.projects_cache_budget)
+    return CacheManager.collect(Settings.projects_cache_folder, budget)
+
+
+def export_precook(label, folder):
+    """
+    Export the precooked project of label and its dependencies as bundles
+    published in folder. The project is built first if needed.
+    """
+    get_precook(label)
+    for dep in _markers[label]['deps']:
+        export_precook(dep, folder)
+
+    key = get_build_key(label)
+    if Bundle.is_published(folder, key):
+        _logger.info("Bundle for {} already present in {}".format(label, folder))
+        return
+
+    metadata = {
+            'label': label,
+            'key': key,
+            'prefix': Settings.projects_cache_folder,
+            'deps': {dep: get_build_key(dep) for dep in _markers[label]['deps']},
+    }
+    Bundle.pack(_get_cache_path(label), folder, key, metadata)
+
+
+def import_precook(label, folder):
+    """
+    Import the precooked project of label and its dependencies from the
+    bundles published in folder. Paths are rewritten when the bundle was
+    exported from another projects cache folder. Return True if the project
+    is present in the cache.
+    """
+    for dep in _markers[label]['deps']:
+        if not import_precook(dep, folder):
+            return False
+
+    key = get_build_key(label)
+    thread_lock, lock_file = _get_precook_lock(key)
+    with thread_lock:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        present = False
+        try:
+            present = is_precooked(label) or _import_bundle(label, folder)
+        finally:
+            fcntl.flock(lock_file,
+                        fcntl.LOCK_SH if present else fcntl.LOCK_UN)
+        return present
+
+
+def _import_bundle(label, folder):
+    """
+    Unpack the bundle of label, without its dependencies, into the cache. The
+    exclusive lock of the entry must be held. Return True on success.
+    """
+    key = get_build_key(label)
+    cache_path = _get_cache_path(label)
+    manifest_path = _get_manifest_path(label)
+
+    if not Bundle.is_published(folder, key):
+        _logger.info("No bundle for {} in {}".format(label, folder))
+        return False
+
+    os.makedirs(Settings.projects_cache_folder, exist_ok=True)
+    metadata = Bundle.unpack(folder, key, Settings.projects_cache_folder)
+
+    old_prefix = metadata['prefix']
+    new_prefix = Settings.projects_cache_folder
+    if old_prefix != new_prefix:
+        _logger.info("Relocating {} from {} to {}".format(label, old_prefix,
+                                                          new_prefix))
+        Bundle.relocate_tree(os.path.join(cache_path, "install"), old_prefix,
+                             new_prefix)
+        _relocate_manifest(manifest_path, old_prefix, new_prefix)
+    CacheManager.record_entry(Settings.projects_cache_folder, key)
+    return True
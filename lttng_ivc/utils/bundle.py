@@ -0,0 +1,169 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import json
+import shutil
+import logging
+import tarfile
+import tempfile
+
+from lttng_ivc.utils.utils import sha256_checksum
+
+_logger = logging.getLogger('project.bundle')
+
+_metadata_name = "bundle.json"
+
+
+def get_archive_path(folder, key):
+    return os.path.join(folder, key + ".tar.gz")
+
+
+def is_published(folder, key):
+    """
+    Check if the bundle of key is completely published in folder.
+    """
+    return os.path.exists(get_archive_path(folder, key) + ".sha256")
+
+
+def _exclude_git(tarinfo):
+    # Sources are checked out from the local remotes, their git object store
+    # does not belong to the bundle.
+    if os.path.basename(tarinfo.name) == ".git":
+        return None
+    return tarinfo
+
+
+def pack(entry_path, folder, key, metadata):
+    """
+    Pack a cache entry and its metadata into a compressed archive published
+    in folder along with its sha256 checksum. Publication is atomic so that
+    concurrent readers of a shared folder never see a partial archive.
+    """
+    archive_path = get_archive_path(folder, key)
+    os.makedirs(folder, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix="." + key, dir=folder)
+    os.close(fd)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        metadata_path = os.path.join(tmpdir, _metadata_name)
+        with open(metadata_path, 'w') as metadata_file:
+            json.dump(metadata, metadata_file)
+        with tarfile.open(tmp_path, "w:gz") as tar:
+            tar.add(metadata_path, arcname=_metadata_name)
+            tar.add(entry_path, arcname=key, filter=_exclude_git)
+
+    checksum = sha256_checksum(tmp_path)
+    fd, tmp_checksum_path = tempfile.mkstemp(prefix="." + key, dir=folder)
+    with os.fdopen(fd, 'w') as checksum_file:
+        checksum_file.write("{}  {}\n".format(checksum,
+                                              os.path.basename(archive_path)))
+    os.chmod(tmp_path, 0o644)
+    os.chmod(tmp_checksum_path, 0o644)
+    # The checksum is published last, it marks the bundle as complete
+    os.replace(tmp_path, archive_path)
+    os.replace(tmp_checksum_path, archive_path + ".sha256")
+    _logger.info("Exported {} to {}".format(entry_path, archive_path))
+    return archive_path
+
+
+def unpack(folder, key, destination):
+    """
+    Validate and extract the archive of key found in folder into
+    destination/key. Return the bundle metadata.
+    """
+    archive_path = get_archive_path(folder, key)
+    with open(archive_path + ".sha256", 'r') as checksum_file:
+        expected = checksum_file.read().split()[0]
+    checksum = sha256_checksum(archive_path)
+    if checksum != expected:
+        raise Exception("Checksum mismatch for {}: {} expected {}".format(
+            archive_path, checksum, expected))
+
+    with tempfile.TemporaryDirectory(dir=destination) as tmpdir:
+        with tarfile.open(archive_path, "r:gz") as tar:
+            for member in tar.getmembers():
+                if member.name != _metadata_name and \
+                        member.name.split('/')[0] != key:
+                    raise Exception("Unexpected member {} in {}".format(
+                        member.name, archive_path))
+            if hasattr(tarfile, 'tar_filter'):
+                # Keep absolute symlinks, they are relocated afterwards
+                tar.extractall(tmpdir, filter='tar')
+            else:
+                tar.extractall(tmpdir)
+        with open(os.path.join(tmpdir, _metadata_name), 'r') as metadata_file:
+            metadata = json.load(metadata_file)
+        entry_path = os.path.join(destination, key)
+        if os.path.isdir(entry_path):
+            shutil.rmtree(entry_path)
+        os.rename(os.path.join(tmpdir, key), entry_path)
+
+    _logger.info("Imported {} to {}".format(archive_path, entry_path))
+    return metadata
+
+
+def _relocate_file(path, old, new):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if old not in data:
+        return
+
+    if data.startswith(b'\x7fELF') or b'\0' in data:
+        # Binary content: paths are NUL terminated strings, shrink them in
+        # place and pad with NUL to keep offsets intact.
+        if len(new) > len(old):
+            raise Exception("Cannot relocate {}: new prefix is longer than {}".format(
+                path, old.decode()))
+        data = bytearray(data)
+        position = data.find(old)
+        while position != -1:
+            end = data.find(b'\0', position)
+            if end == -1:
+                end = len(data)
+            string = bytes(data[position:end])
+            relocated = string.replace(old, new)
+            data[position:end] = relocated.ljust(len(string), b'\0')
+            position = data.find(old, position + len(new))
+    else:
+        data = data.replace(old, new)
+
+    with open(path, 'r+b') as f:
+        f.write(data)
+        f.truncate()
+
+
+def relocate_tree(root, old_prefix, new_prefix):
+    """
+    Rewrite old_prefix into new_prefix in the files and symlinks under root.
+    """
+    old = old_prefix.encode()
+    new = new_prefix.encode()
+    for base, dirs, files in os.walk(root):
+        for name in files:
+            path = os.path.join(base, name)
+            if os.path.islink(path):
+                target = os.readlink(path)
+                if target.startswith(old_prefix):
+                    os.unlink(path)
+                    os.symlink(target.replace(old_prefix, new_prefix, 1), path)
+                continue
+            _relocate_file(path, old, new)
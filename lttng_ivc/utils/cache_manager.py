@@ -0,0 +1,176 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import re
+import fcntl
+import shutil
+import logging
+
+_logger = logging.getLogger('project.cache_manager')
+
+_entry_regex = re.compile(r'^[0-9a-f]{64}$')
+_size_units = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+
+def parse_size(size):
+    """
+    Parse a size in bytes with an optional K, M, G or T suffix.
+    """
+    match = re.match(r'^\s*(\d+)\s*([KMGT]?)i?B?\s*$', str(size), re.IGNORECASE)
+    if match is None:
+        raise Exception("Invalid size {}".format(size))
+    return int(match.group(1)) * _size_units[match.group(2).upper()]
+
+
+def _get_lock_path(folder, key):
+    return os.path.join(folder, key + ".lock")
+
+
+def _get_size_path(folder, key):
+    return os.path.join(folder, key, "size")
+
+
+def get_tree_size(path):
+    """
+    Return the disk usage of a tree in bytes. Hard links are counted once.
+    """
+    size = 0
+    seen = set()
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            st = os.lstat(os.path.join(root, name))
+            if (st.st_dev, st.st_ino) in seen:
+                continue
+            seen.add((st.st_dev, st.st_ino))
+            size += st.st_blocks * 512
+    return size
+
+
+def record_entry(folder, key):
+    """
+    Record the size of a published entry and mark it as accessed.
+    """
+    size = get_tree_size(os.path.join(folder, key))
+    with open(_get_size_path(folder, key), 'w') as size_file:
+        size_file.write(str(size))
+    touch_entry(folder, key)
+
+
+def touch_entry(folder, key):
+    """
+    Update the access time of an entry, kept as the mtime of its lock file.
+    """
+    with open(_get_lock_path(folder, key), 'a'):
+        pass
+    os.utime(_get_lock_path(folder, key))
+
+
+def get_entries(folder):
+    """
+    Return a list of (access time, size, key) of the entries of folder.
+    """
+    entries = []
+    if not os.path.isdir(folder):
+        return entries
+    for key in os.listdir(folder):
+        path = os.path.join(folder, key)
+        if not _entry_regex.match(key) or not os.path.isdir(path):
+            continue
+        try:
+            with open(_get_size_path(folder, key), 'r') as size_file:
+                size = int(size_file.read())
+        except (FileNotFoundError, ValueError):
+            size = get_tree_size(path)
+        try:
+            atime = os.stat(_get_lock_path(folder, key)).st_mtime
+        except FileNotFoundError:
+            atime = os.stat(path).st_mtime
+        entries.append((atime, size, key))
+    return entries
+
+
+def collect(folder, budget):
+    """
+    Evict the least recently used entries of folder until its size fits in
+    budget bytes. Entries locked by anyone, i.e. in use or being built, are
+    never evicted. Return the number of bytes reclaimed.
+    """
+    entries = sorted(get_entries(folder))
+    total = sum(size for atime, size, key in entries)
+    reclaimed = 0
+    for atime, size, key in entries:
+        if total - reclaimed <= budget:
+            break
+        # Lock files are kept, removing them would let two processes lock
+        # different files for the same entry.
+        with open(_get_lock_path(folder, key), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                _logger.debug("Entry {} in use, not evicted".format(key))
+                continue
+            path = os.path.join(folder, key)
+            # Unpublish first, an entry without manifest is never used
+            manifest_path = os.path.join(path, "manifest")
+            if os.path.exists(manifest_path):
+                os.unlink(manifest_path)
+            shutil.rmtree(path)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        _logger.info("Evicted entry {} of {} bytes".format(key, size))
+        reclaimed += size
+
+    if total - reclaimed > budget:
+        _logger.warning("Cache size {} still over budget {}, entries are in use".format(
+            total - reclaimed, budget))
+    return reclaimed
+
+
+def collect_files(folder, budget, suffix):
+    """
+    Remove the least recently used files of folder ending with suffix until
+    their size fits in budget bytes. The mtime of a file is its access time,
+    readers must tolerate a file removed under them. Return the number of
+    bytes reclaimed.
+    """
+    files = []
+    if os.path.isdir(folder):
+        for name in os.listdir(folder):
+            if not name.endswith(suffix):
+                continue
+            try:
+                st = os.stat(os.path.join(folder, name))
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_blocks * 512, name))
+    files.sort()
+    total = sum(size for mtime, size, name in files)
+    reclaimed = 0
+    for mtime, size, name in files:
+        if total - reclaimed <= budget:
+            break
+        try:
+            os.unlink(os.path.join(folder, name))
+        except FileNotFoundError:
+            continue
+        _logger.info("Evicted {} of {} bytes".format(name, size))
+        reclaimed += size
+    return reclaimed
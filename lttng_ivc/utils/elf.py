@@ -0,0 +1,132 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import mmap
+import struct
+
+from concurrent.futures import ThreadPoolExecutor
+
+ELF_MAGIC = b'\x7fELF'
+
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+
+PT_DYNAMIC = 2
+
+DT_NULL = 0
+DT_RPATH = 15
+DT_RUNPATH = 29
+
+"""
+Per class layout: (e_phoff format, e_phoff offset, e_phentsize offset,
+program header format keeping p_type/p_offset/p_filesz, dynamic entry format)
+"""
+_layouts = {
+    ELFCLASS32: ('I', 0x1C, 0x2A, 'II8xI12x', 'iI'),
+    ELFCLASS64: ('Q', 0x20, 0x36, 'I4xQ16xQ16x', 'qQ'),
+}
+
+
+class ElfError(Exception):
+    pass
+
+
+def is_elf(path):
+    with open(path, 'rb') as f:
+        return f.read(4) == ELF_MAGIC
+
+
+def _find_dynamic(elf, endian, layout):
+    """
+    Return the (offset, size) of the dynamic section or None.
+    """
+    offset_fmt, phoff_offset, phentsize_offset, phdr_fmt, _ = layout
+    phoff, = struct.unpack_from(endian + offset_fmt, elf, phoff_offset)
+    phentsize, phnum = struct.unpack_from(endian + 'HH', elf, phentsize_offset)
+    phdr = struct.Struct(endian + phdr_fmt)
+    for i in range(phnum):
+        p_type, p_offset, p_filesz = phdr.unpack_from(elf, phoff + i * phentsize)
+        if p_type == PT_DYNAMIC:
+            return (p_offset, p_filesz)
+    return None
+
+
+def strip_rpath(path):
+    """
+    Remove the DT_RPATH and DT_RUNPATH entries of an ELF file in place, the
+    same way chrpath -d does: following entries are moved up and the freed
+    slots become DT_NULL. Return the list of removed tags or None if the file
+    is not an ELF.
+    """
+    # Only open ELF files for writing, installed data files may be read-only
+    if not is_elf(path):
+        return None
+    with open(path, 'r+b') as f:
+        with mmap.mmap(f.fileno(), 0) as elf:
+            elf_class, elf_data = elf[4], elf[5]
+            if elf_class not in _layouts or \
+                    elf_data not in (ELFDATA2LSB, ELFDATA2MSB):
+                raise ElfError("{}: unsupported ELF class {} data {}".format(
+                    path, elf_class, elf_data))
+            endian = '<' if elf_data == ELFDATA2LSB else '>'
+            layout = _layouts[elf_class]
+
+            dynamic = _find_dynamic(elf, endian, layout)
+            if dynamic is None:
+                return []
+            offset, size = dynamic
+            if offset + size > len(elf):
+                raise ElfError("{}: truncated dynamic section".format(path))
+
+            entry = struct.Struct(endian + layout[4])
+            kept = []
+            removed = []
+            for d_tag, d_val in entry.iter_unpack(elf[offset:offset + size - size % entry.size]):
+                if d_tag == DT_NULL:
+                    break
+                if d_tag in (DT_RPATH, DT_RUNPATH):
+                    removed.append(d_tag)
+                else:
+                    kept.append((d_tag, d_val))
+
+            if removed:
+                for i in range(size // entry.size):
+                    d_tag, d_val = kept[i] if i < len(kept) else (DT_NULL, 0)
+                    entry.pack_into(elf, offset + i * entry.size, d_tag, d_val)
+                elf.flush()
+    return removed
+
+
+def strip_rpath_files(paths, workers=None):
+    """
+    Strip the rpath of multiple files using a pool of threads. Return a list
+    of (path, removed tags or None, exception or None).
+    """
+    def strip(path):
+        try:
+            return (path, strip_rpath(path), None)
+        except (OSError, ValueError, struct.error, ElfError) as e:
+            return (path, None, e)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(strip, paths))
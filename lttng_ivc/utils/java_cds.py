@@ -0,0 +1,165 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import re
+import shutil
+import hashlib
+import logging
+import tempfile
+import subprocess
+
+import lttng_ivc.settings as Settings
+
+from lttng_ivc.utils.utils import sha256_checksum, file_lock
+
+_logger = logging.getLogger('runtime.java_cds')
+
+# Version output of JDK tools by resolved path
+_versions = {}
+
+
+def get_version(env, tool="java"):
+    """
+    Return the version output of a JDK tool found in the PATH of env. None if
+    absent.
+    """
+    path = shutil.which(tool, path=env.get("PATH"))
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+    if path not in _versions:
+        try:
+            p = subprocess.run([path, '-version'], stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, env=env,
+                               universal_newlines=True)
+            _versions[path] = p.stdout.strip()
+        except OSError:
+            _versions[path] = None
+    return _versions[path]
+
+
+def get_major_version(version):
+    """
+    Return the feature release of a java -version output, 8 for 1.8.0_292.
+    """
+    match = re.search(r'version "(\d+)(?:\.(\d+))?', version or "")
+    if match is None:
+        return None
+    major = int(match.group(1))
+    if major == 1 and match.group(2) is not None:
+        major = int(match.group(2))
+    return major
+
+
+def get_classpath_jars(env):
+    """
+    Return the jar files of the CLASSPATH of env.
+    """
+    return [path for path in env.get("CLASSPATH", "").split(":")
+            if path.endswith(".jar") and os.path.isfile(path)]
+
+
+def _get_leading_jars(env):
+    jars = []
+    for path in env.get("CLASSPATH", "").split(":"):
+        if not path.endswith(".jar") or not os.path.isfile(path):
+            break
+        jars.append(path)
+    return jars
+
+
+def _get_archive_path(env):
+    """
+    Return the path of the archive for the java of env and the jars leading
+    the CLASSPATH, None if not applicable. The classpath used to create an
+    archive must be a prefix of the one used at run time, directories can't
+    be archived.
+    """
+    if not Settings.java_cds:
+        return None
+    version = get_version(env)
+    major = get_major_version(version)
+    # Application classes can be archived since JDK 10
+    if major is None or major < 10:
+        return None
+
+    jars = _get_leading_jars(env)
+    if not jars:
+        return None
+
+    sha256 = hashlib.sha256(version.encode('utf8'))
+    for jar in jars:
+        sha256.update("{} {}\n".format(jar, sha256_checksum(jar)).encode('utf8'))
+    return os.path.join(Settings.java_cds_folder, sha256.hexdigest() + ".jsa")
+
+
+def get_options(env):
+    """
+    Return a tuple of (java options, class list path). The options use the
+    archive of env if present. Otherwise they record the classes loaded in
+    the returned class list, to be passed to dump once the run completes.
+    """
+    archive = _get_archive_path(env)
+    if archive is None or os.path.exists(archive + ".failed"):
+        return [], None
+    if os.path.exists(archive):
+        return ['-XX:SharedArchiveFile={}'.format(archive)], None
+
+    os.makedirs(Settings.java_cds_folder, exist_ok=True)
+    fd, class_list = tempfile.mkstemp(dir=Settings.java_cds_folder,
+                                      suffix=".classlist")
+    os.close(fd)
+    return ['-XX:DumpLoadedClassList={}'.format(class_list)], class_list
+
+
+def dump(env, class_list):
+    """
+    Create the archive of env from a class list recorded by a previous run.
+    A failure is recorded to not try again.
+    """
+    archive = _get_archive_path(env)
+    try:
+        with file_lock(archive + ".lock"):
+            if (os.path.exists(archive) or os.path.exists(archive + ".failed")
+                    or os.path.getsize(class_list) == 0):
+                return
+
+            jars = _get_leading_jars(env)
+            tmp_path = "{}.{}".format(archive, os.getpid())
+            args = [shutil.which("java", path=env.get("PATH")), '-Xshare:dump',
+                    '-XX:SharedClassListFile={}'.format(class_list),
+                    '-XX:SharedArchiveFile={}'.format(tmp_path),
+                    '-cp', ":".join(jars)]
+            p = subprocess.run(args, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, env=env,
+                               universal_newlines=True)
+            if p.returncode != 0:
+                _logger.warning("Class data sharing archive creation failed: {}".format(p.stdout))
+                with open(archive + ".failed", 'w') as failed:
+                    failed.write(p.stdout)
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                return
+            os.replace(tmp_path, archive)
+            _logger.debug("Created class data sharing archive {} for {}".format(archive, jars))
+    finally:
+        os.unlink(class_list)
@@ -0,0 +1,172 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import atexit
+import shutil
+import select
+import asyncio
+import logging
+import tempfile
+import contextlib
+
+import lttng_ivc.settings as Settings
+
+_logger = logging.getLogger('jobserver')
+
+# Path of the jobserver fifo shared with every process spawned by the harness
+_env_variable = "LTTNG_IVC_JOBSERVER"
+
+_jobserver = None
+
+
+class Jobserver(object):
+    """
+    A GNU make jobserver backed by a named fifo. Every make pointed to it
+    through MAKEFLAGS takes its job tokens from the same pool, regardless of
+    the process or the thread that spawned it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Open read-write so that opening never blocks and the fifo keeps its
+        # tokens as long as a process holds it.
+        self.fd = os.open(path, os.O_RDWR)
+
+    def get_makeflags(self):
+        # The same read-write descriptor is used to take and return tokens.
+        return "-j --jobserver-auth={0},{0}".format(self.fd)
+
+    def acquire(self):
+        """
+        Take a job token, blocking until one is available.
+        """
+        while True:
+            try:
+                return os.read(self.fd, 1)
+            except BlockingIOError:
+                # make sets O_NONBLOCK on the shared file description, wait
+                # for a token and race the other readers for it.
+                select.select([self.fd], [], [])
+
+    def release(self, token):
+        os.write(self.fd, token)
+
+    def close(self):
+        os.close(self.fd)
+
+
+def start(slots=None):
+    """
+    Create the jobserver of this process and its children with slots job
+    slots, defaults to the number of usable cpu.
+
+    The fifo holds all the slots. A make only owns an implicit slot, without
+    taking a token, when it is started by another make: top-level ones
+    started by the harness hold a token through slot() instead.
+    """
+    global _jobserver
+
+    if slots is None:
+        slots = len(os.sched_getaffinity(0))
+
+    directory = tempfile.mkdtemp(prefix=Settings.tmp_object_prefix)
+    path = os.path.join(directory, "jobserver")
+    os.mkfifo(path)
+
+    jobserver = Jobserver(path)
+    os.write(jobserver.fd, b'+' * slots)
+
+    def cleanup():
+        jobserver.close()
+        shutil.rmtree(directory, ignore_errors=True)
+    atexit.register(cleanup)
+
+    os.environ[_env_variable] = path
+    _jobserver = jobserver
+    _logger.info("Jobserver {} started with {} slots".format(path, slots))
+    return jobserver
+
+
+def get():
+    """
+    Return the jobserver started by this process or inherited from the
+    environment. Return None if there is none.
+    """
+    global _jobserver
+
+    if _jobserver is None:
+        path = os.environ.get(_env_variable)
+        if path and os.path.exists(path):
+            _jobserver = Jobserver(path)
+    return _jobserver
+
+
+def share(env):
+    """
+    Point the make invocations of a subprocess using env to the jobserver.
+    Return the file descriptors to pass to the subprocess.
+    """
+    jobserver = get()
+    if jobserver is None:
+        return ()
+    env['MAKEFLAGS'] = jobserver.get_makeflags()
+    return (jobserver.fd,)
+
+
+@contextlib.contextmanager
+def slot():
+    """
+    Hold a job slot of the jobserver, if any, for the lifetime of a top-level
+    make or configure run. The make uses it as its implicit slot.
+    """
+    jobserver = get()
+    if jobserver is None:
+        yield
+        return
+    token = jobserver.acquire()
+    try:
+        yield
+    finally:
+        jobserver.release(token)
+
+
+@contextlib.asynccontextmanager
+async def async_slot():
+    """
+    Asynchronous slot(), the event loop keeps running while waiting for a
+    token.
+    """
+    jobserver = get()
+    if jobserver is None:
+        yield
+        return
+    future = asyncio.get_running_loop().run_in_executor(None, jobserver.acquire)
+    try:
+        token = await asyncio.shield(future)
+    except asyncio.CancelledError:
+        # The token is taken anyway, give it back once read
+        future.add_done_callback(lambda f: jobserver.release(f.result()))
+        raise
+    try:
+        yield
+    finally:
+        jobserver.release(token)
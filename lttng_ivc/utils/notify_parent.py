@@ -0,0 +1,89 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""
+Run a command as a child process and report its readiness notification.
+
+Daemons started with -S, e.g. lttng-sessiond, send SIGUSR1 to their parent
+once ready. This helper stands as that parent: on SIGUSR1 it writes a byte
+to the file descriptor given as first argument, it forwards the other
+signals it receives to the command and exits with its status. The reader
+of the pipe sees end of file if the command exits without notifying.
+
+Usage: notify_parent.py FD COMMAND [ARG...]
+
+Only the standard library is used, the helper runs in the environment of the
+command.
+"""
+
+import os
+import sys
+import signal
+import subprocess
+
+# Signals relayed to the command
+_forwarded_signals = [signal.SIGTERM, signal.SIGINT, signal.SIGHUP,
+                      signal.SIGQUIT, signal.SIGUSR2]
+
+
+def get_launcher(fd):
+    """
+    Return the arguments to prepend to a command line to run it under this
+    helper, notifying on fd.
+    """
+    return [sys.executable, "-I", os.path.abspath(__file__), str(fd)]
+
+
+def main(argv):
+    notify_fd = [int(argv[1])]
+    child = [None]
+    pending = []
+
+    def notify(signum, frame):
+        if notify_fd[0] is not None:
+            os.write(notify_fd[0], b"1")
+            os.close(notify_fd[0])
+            notify_fd[0] = None
+
+    def forward(signum, frame):
+        if child[0] is None:
+            pending.append(signum)
+        else:
+            child[0].send_signal(signum)
+
+    signal.signal(signal.SIGUSR1, notify)
+    for signum in _forwarded_signals:
+        signal.signal(signum, forward)
+
+    child[0] = subprocess.Popen(argv[2:])
+    for signum in pending:
+        child[0].send_signal(signum)
+    returncode = child[0].wait()
+
+    if returncode < 0:
+        # Die from the same signal
+        signal.signal(-returncode, signal.SIG_DFL)
+        os.kill(os.getpid(), -returncode)
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,103 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import logging
+
+import yaml
+
+import lttng_ivc.utils.scheduler as Scheduler
+
+_logger = logging.getLogger('project.planner')
+
+# Fields of a marker influencing the resulting build
+_marker_fields = ['project', 'sha1', 'deps']
+
+
+def load_markers(path):
+    """
+    Load a run configuration. Return an empty dictionary if absent.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as stream:
+        markers = yaml.load(stream, Loader=yaml.FullLoader)
+    return markers or {}
+
+
+def save_markers(path, markers):
+    tmp_path = "{}.{}".format(path, os.getpid())
+    with open(tmp_path, 'w') as stream:
+        yaml.dump(markers, stream, default_flow_style=False)
+    os.replace(tmp_path, path)
+
+
+def get_dependents(graph):
+    """
+    Return a dictionary of label to the list of labels directly depending on
+    it.
+    """
+    dependents = {label: [] for label in graph}
+    for label, deps in graph.items():
+        for dep in deps:
+            dependents[dep].append(label)
+    return dependents
+
+
+def plan(previous, current, targets, is_cached=None):
+    """
+    Compute the minimal set of markers to rebuild for targets.
+
+    previous is the run configuration of the last build and current the new
+    one. A marker is rebuilt when it is new, when its definition changed or,
+    if is_cached is given, when its precooked project is absent. Markers
+    depending on a rebuilt marker, transitively, are rebuilt too.
+
+    Return a dictionary of label to the reason of the rebuild.
+    """
+    graph = {label: marker['deps'] for label, marker in current.items()}
+    needed = Scheduler.dependency_closure(graph, targets)
+
+    reasons = {}
+    for label in sorted(needed):
+        marker = current[label]
+        if label not in previous:
+            reasons[label] = "new marker"
+            continue
+        changed = [field for field in _marker_fields
+                   if previous[label].get(field) != marker.get(field)]
+        if changed:
+            reasons[label] = "{} changed".format(", ".join(changed))
+        elif is_cached is not None and not is_cached(label):
+            reasons[label] = "not cached"
+
+    dependents = get_dependents(graph)
+    stack = list(reasons)
+    while stack:
+        label = stack.pop()
+        for dependent in dependents[label]:
+            if dependent in needed and dependent not in reasons:
+                reasons[dependent] = "dependency {} rebuilt".format(label)
+                stack.append(dependent)
+
+    for label in sorted(reasons):
+        _logger.debug("{} planned: {}".format(label, reasons[label]))
+    return reasons
@@ -0,0 +1,141 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import fcntl
+import socket
+import logging
+import threading
+
+from contextlib import closing
+
+import lttng_ivc.settings as Settings
+
+_logger = logging.getLogger('runtime.ports')
+
+# Next port to try within the range of this process
+_next_port = None
+_next_port_guard = threading.Lock()
+
+
+def get_ephemeral_start():
+    """
+    Return the first port of the range the kernel picks ephemeral ports from.
+    """
+    try:
+        with open("/proc/sys/net/ipv4/ip_local_port_range") as f:
+            return int(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 32768
+
+
+def get_worker_range():
+    """
+    Return the (start, end) range of ports of this pytest-xdist worker, end
+    excluded. Workers get disjoint ranges below the ephemeral port range.
+    """
+    start = Settings.ports_range_start
+    end = get_ephemeral_start()
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
+    count = int(os.environ.get("PYTEST_XDIST_WORKER_COUNT", "1"))
+    index = int(worker[len("gw"):] or 0)
+    size = (end - start) // count
+    if size < 1:
+        raise Exception("No port left for worker {} in {}-{}".format(
+            worker, start, end))
+    return (start + index * size, start + (index + 1) * size)
+
+
+def _is_bindable(port):
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
+        # As the daemons do, ignore connections lingering in TIME_WAIT
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            s.bind(('', port))
+        except OSError:
+            return False
+    return True
+
+
+class Reservation(object):
+    """
+    Ports reserved for a daemon. They are not handed out again, in this run
+    or a concurrent one, until release() is called once the daemon has bound
+    them.
+    """
+
+    def __init__(self, ports, locks):
+        self.ports = ports
+        self.__locks = locks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def release(self):
+        for lock in self.__locks:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+        self.__locks = []
+
+
+def reserve(number=1):
+    """
+    Reserve number ports from the range of the worker and return the
+    Reservation.
+    """
+    global _next_port
+
+    start, end = get_worker_range()
+    os.makedirs(Settings.ports_folder, exist_ok=True)
+    ports = []
+    locks = []
+    with _next_port_guard:
+        port = _next_port if _next_port in range(start, end) else start
+        for i in range(end - start):
+            if len(ports) == number:
+                break
+            candidate = port
+            port = start + (port + 1 - start) % (end - start)
+
+            lock = open(os.path.join(Settings.ports_folder,
+                                     "{}.lock".format(candidate)), 'a')
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                continue
+            if not _is_bindable(candidate):
+                fcntl.flock(lock, fcntl.LOCK_UN)
+                lock.close()
+                continue
+            ports.append(candidate)
+            locks.append(lock)
+        _next_port = port
+
+    reservation = Reservation(ports, locks)
+    if len(ports) != number:
+        reservation.release()
+        raise Exception("No free port left in {}-{}".format(start, end))
+    _logger.debug("Reserved ports {}".format(ports))
+    return reservation
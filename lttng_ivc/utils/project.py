@@ -19,40 +19,110 @@
 # SOFTWARE.
 
 import os
+import time
 import shutil
+import inspect
+import hashlib
+import tarfile
+import tempfile
+import mmap
 import git
 import subprocess
 import logging
 import lttng_ivc.settings as Settings
+import lttng_ivc.utils.jobserver as Jobserver
+import lttng_ivc.utils.elf as Elf
+import lttng_ivc.utils.cache_manager as CacheManager
 import pprint
-import magic
+import re
 
-from lttng_ivc.utils.utils import sha256_checksum
-from lttng_ivc.utils.utils import find_dir, find_file
+from lttng_ivc.utils.utils import find_dir, find_file, clone_tree
+from lttng_ivc.utils.utils import get_compiler_version, file_lock
+from lttng_ivc.utils.utils import TrackedDict
 
 _logger = logging.getLogger('project')
 
+# Tools whose version influences the output of a project bootstrap
+_autotools = ['autoconf', 'automake', 'libtoolize', 'm4', 'pkg-config']
+_autotools_fingerprint = None
+
+
+def _get_autotools_fingerprint():
+    global _autotools_fingerprint
+    if _autotools_fingerprint is None:
+        versions = [os.environ.get("ACLOCAL_PATH", "")]
+        for tool in _autotools:
+            try:
+                p = subprocess.run([tool, '--version'],
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL,
+                                   universal_newlines=True)
+                versions.append(p.stdout.split('\n')[0])
+            except OSError:
+                versions.append("{} not found".format(tool))
+        _autotools_fingerprint = "\n".join(versions)
+    return _autotools_fingerprint
+
+
+# Name of the variable set by a line of an autoconf cache file
+_cache_line_regex = re.compile(r'^(?:test "\$\{\w+\+set\}" = set \|\| )?(\w+)=')
+
+
+def _read_configure_cache(path):
+    """
+    Return a dictionary of variable name to line of an autoconf cache file.
+    """
+    lines = {}
+    name = None
+    if os.path.exists(path):
+        with open(path, 'r') as cache:
+            for line in cache:
+                match = _cache_line_regex.match(line)
+                if match:
+                    name = match.group(1)
+                    lines[name] = line
+                elif name is not None and not line.startswith('#'):
+                    # Continuation of a multi-line quoted value
+                    lines[name] += line
+    return lines
+
+
 class Project(object):
 
-    def __init__(self, label, git_path, sha1, tmpdir):
+    """
+    Methods defining how a project is built. Their source is part of the
+    build key of precooked projects.
+    """
+    _build_recipe = ['__init__', 'get_default_configure_flags', 'get_env',
+                     'autobuild',
+                     'get_cppflags', 'get_ldflags', 'get_ld_library_path',
+                     'get_pkg_config_path', 'checkout', 'bootstrap',
+                     'configure', 'build', 'install', 'rpath_strip']
+
+    """
+    Attributes saved in the manifest of a precooked project.
+    """
+    _manifest_attributes = ['label', 'git_path', 'sha1',
+                            'custom_configure_flags', 'isBuilt',
+                            'isConfigured', 'isInstalled', 'skip', 'basedir',
+                            'log_path', 'source_path', 'installation_path',
+                            'special_env_variables']
+
+    def __init__(self, label, git_path, sha1, tmpdir, precook=None):
         self.label = label
         self.git_path = git_path
         self.sha1 = sha1
 
         """ Custom configure flags in the for of ['-x', 'arg']"""
-        self.custom_configure_flags = []
-        ccache = shutil.which("ccache")
-        if ccache is not None:
-            self.custom_configure_flags.append("CC={} gcc".format(ccache))
-            self.custom_configure_flags.append("CXX={} g++".format(ccache))
-
-        self.custom_configure_flags.append("CFLAGS=-g -O0")
+        self.custom_configure_flags = self.get_default_configure_flags()
 
         # A collection of Project dependencies
         self.dependencies = {}
-        # used for project cache and pickle validation
+        # used for project cache and manifest validation
         self._immutable = False
-        self._py_file_checksum = sha256_checksum(Settings.project_py_file_location)
+        self._build_key = None
+        # Build inputs of the precooked outputs cloned by materialize
+        self._precook_inputs = None
 
         # State
         self.isBuilt = False
@@ -78,8 +148,59 @@ class Project(object):
         self.special_env_variables = {}
 
         # Init the repo for work
-        self.checkout()
-        self.bootstrap()
+        if precook is not None:
+            self.materialize(precook)
+        else:
+            self.checkout()
+            self.bootstrap()
+
+    @classmethod
+    def get_default_configure_flags(cls):
+        flags = []
+        ccache = shutil.which("ccache")
+        if ccache is not None:
+            flags.append("CC={} gcc".format(ccache))
+            flags.append("CXX={} g++".format(ccache))
+
+        flags.append("CFLAGS=-g -O0")
+        return flags
+
+    @classmethod
+    def get_recipe_checksum(cls):
+        """
+        Return the sha256 of the source of the build recipe methods defined
+        by this class and its base classes.
+        """
+        sha256 = hashlib.sha256()
+        for name in cls._build_recipe:
+            for klass in cls.__mro__:
+                if klass is not object and name in vars(klass):
+                    member = vars(klass)[name]
+                    # Unwrap classmethod
+                    member = getattr(member, '__func__', member)
+                    source = inspect.getsource(member)
+                    sha256.update(source.encode('utf8'))
+        return sha256.hexdigest()
+
+    # Runtimes memoize their environment, modifications of the dictionaries
+    # it is derived from are tracked.
+    @property
+    def special_env_variables(self):
+        return self._special_env_variables
+
+    @special_env_variables.setter
+    def special_env_variables(self, value):
+        self._special_env_variables = TrackedDict()
+        self._special_env_variables.update(value)
+
+    @property
+    def dependencies(self):
+        return self._dependencies
+
+    @dependencies.setter
+    def dependencies(self, value):
+        self._dependencies = TrackedDict()
+        self._dependencies.update(value)
 
     def add_special_env_variable(self, key, value):
         if key in self.special_env_variables:
@@ -163,7 +284,7 @@ class Project(object):
     def autobuild(self):
         """
         Perform the bootstrap, configuration, build and install the
-        project. Build dependencies if not already built
+        project. Build dependencies if not already built.
         """
         if (self.isConfigured and self.isBuilt and self.isInstalled):
             return
@@ -200,7 +321,7 @@ class Project(object):
         _logger.debug("{} Autobuild rpath strip".format(self.label))
         try:
             self.rpath_strip()
-        except subprocess.CalledProcessError as e:
+        except Elf.ElfError as e:
             _logger.error("{} Rpath stripping failed. See {} for more details.".format(self.label, self.log_path))
             raise e
 
@@ -208,16 +329,105 @@ class Project(object):
         if self._immutable:
             raise Exception("Object is immutable. Illegal checkout")
 
-        repo = git.Repo.clone_from(self.git_path, self.source_path)
+        # Borrow the object store of the local remote through git alternates
+        # instead of copying or hardlinking its objects.
+        repo = git.Repo.clone_from(self.git_path, self.source_path,
+                                   shared=True, no_checkout=True)
         commit = repo.commit(self.sha1)
         repo.head.reference = commit
         assert repo.head.is_detached
         repo.head.reset(index=True, working_tree=True)
 
+    def materialize(self, precook):
+        """
+        Clone the source and installation trees of a precooked project of the
+        same sha1 instead of checking out and bootstrapping. The state is left
+        unbuilt so that autobuild reconfigures for this installation prefix,
+        the build then reuses the objects of the precooked project as long as
+        it is configured with the same dependencies and flags, see configure.
+
+        Build outputs embedding the precooked installation prefix are left
+        out to be rebuilt, make does not track prefix dependent flags. A
+        precooked project without git repository, imported from a bundle, is
+        checked out and bootstrapped instead.
+        """
+        if self._immutable:
+            raise Exception("Object is immutable. Illegal materialize")
+        if precook.sha1 != self.sha1:
+            raise Exception("Precooked project sha1 {} does not match {}".format(
+                precook.sha1, self.sha1))
+
+        if not os.path.isdir(os.path.join(precook.source_path, ".git")):
+            # Imported from a bundle, the build outputs cannot be told apart
+            # from the sources.
+            _logger.debug("No git repository in {}, checking out".format(
+                precook.source_path))
+            self.checkout()
+            self.bootstrap()
+            return
+
+        # Git replaces files instead of modifying them, the build outputs of
+        # the source tree are modified in place.
+        repo = git.Repo(precook.source_path)
+        tracked = set(repo.git.ls_files().splitlines())
+        prefix = precook.installation_path.encode('utf8')
+
+        def is_source(path):
+            return path in tracked or path.startswith('.git' + os.sep)
+
+        def may_embed_prefix(path):
+            # Objects and libtool, pkg-config and template outputs. Linked
+            # outputs are relinked from their objects.
+            return (path.endswith(('.o', '.lo', '.la', '.pc')) or
+                    os.path.basename(path) in ('config.status', 'libtool') or
+                    path + '.in' in tracked)
+
+        def is_stale(path):
+            if is_source(path) or not may_embed_prefix(path):
+                return False
+            with open(os.path.join(precook.source_path, path), 'rb') as output:
+                if os.fstat(output.fileno()).st_size == 0:
+                    return False
+                with mmap.mmap(output.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return data.find(prefix) != -1
+
+        clone_tree(precook.source_path, self.source_path, hardlink=is_source,
+                   skip=is_stale)
+        # Installed binaries get their rpath rewritten in place, never hard
+        # link them.
+        clone_tree(precook.installation_path, self.installation_path)
+        self._precook_inputs = precook._get_build_inputs()
+
+    def _get_build_inputs(self):
+        """
+        Return what make does not track among the inputs of the build
+        outputs: the configure flags and the dependencies, by build key.
+        Fresh dependencies have none and never match.
+        """
+        return (list(self.custom_configure_flags),
+                {name: dep._build_key
+                 for name, dep in self.dependencies.items()})
+
+    def _discard_precook_outputs(self):
+        """
+        Remove the build outputs and the installation cloned from a precooked
+        project, leaving the sources and the bootstrap output.
+        """
+        _logger.debug("{} Discarding precooked build outputs".format(self.label))
+        git.Repo(self.source_path).git.clean('-fdxq')
+        self.bootstrap()
+        shutil.rmtree(self.installation_path)
+        os.makedirs(os.path.join(self.installation_path, "include"))
+        os.makedirs(os.path.join(self.installation_path, "lib"))
+
     def bootstrap(self):
         """
         Bootstap the project. Raise subprocess.CalledProcessError on
         bootstrap error.
+
+        The generated files only depend on the sources and the autotools
+        versions. They are cached on first bootstrap and restored afterwards.
+        Return None when restored from the cache.
         """
         if self._immutable:
             raise Exception("Object is immutable. Illegal bootstrap")
@@ -225,12 +435,63 @@ class Project(object):
         out = os.path.join(self.log_path, "bootstrap.out")
         err = os.path.join(self.log_path, "bootstrap.err")
 
-        os.chdir(self.source_path)
+        key = hashlib.sha256("{}\n{}".format(
+            self.sha1, _get_autotools_fingerprint()).encode('utf8')).hexdigest()
+        archive = os.path.join(Settings.bootstrap_cache_folder, key + ".tar")
+
+        try:
+            self._restore_bootstrap(archive)
+            with open(out, 'w') as stdout:
+                stdout.write("Restored from {}\n".format(archive))
+            return None
+        except FileNotFoundError:
+            # Not cached yet or evicted meanwhile
+            pass
+
         with open(out, 'w') as stdout, open(err, 'w') as stderr:
-            p = subprocess.run(['./bootstrap'], stdout=stdout, stderr=stderr)
+            p = subprocess.run(['./bootstrap'], stdout=stdout, stderr=stderr,
+                               cwd=self.source_path)
         p.check_returncode()
+        self._save_bootstrap(archive)
         return p
 
+    def _save_bootstrap(self, archive):
+        # The checkout is clean before bootstrap, untracked files are the
+        # bootstrap output.
+        repo = git.Repo(self.source_path)
+        generated = [path for path in repo.git.ls_files('--others').splitlines()
+                     if not path.startswith('autom4te.cache/')]
+
+        os.makedirs(Settings.bootstrap_cache_folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=Settings.bootstrap_cache_folder)
+        with os.fdopen(fd, 'wb') as tmp, tarfile.open(fileobj=tmp, mode='w') as tar:
+            for path in generated:
+                tar.add(os.path.join(self.source_path, path), arcname=path)
+        os.replace(tmp_path, archive)
+        CacheManager.collect_files(Settings.bootstrap_cache_folder,
+                                   CacheManager.parse_size(
+                                       Settings.bootstrap_cache_budget),
+                                   ".tar")
+
+    def _restore_bootstrap(self, archive):
+        with tarfile.open(archive, 'r') as tar:
+            names = tar.getnames()
+            if hasattr(tarfile, 'tar_filter'):
+                # Autotools may install absolute symlinks (install-sh,
+                # depcomp, ...), rejected by the default data filter.
+                tar.extractall(self.source_path, filter='tar')
+            else:
+                tar.extractall(self.source_path)
+        # Mark the archive as recently used
+        os.utime(archive)
+
+        # Restored files must not look older than the checked out sources or
+        # make would rerun the autotools.
+        now = time.time()
+        for name in names:
+            os.utime(os.path.join(self.source_path, name), (now, now),
+                     follow_symlinks=False)
+
     def configure(self):
         """
         Configure the project.
@@ -245,34 +506,101 @@ class Project(object):
                 # TODO: Custom exception here Dependency Error
                 raise Exception("Dependency project flagged as not installed")
 
+        # Objects built against other dependencies or flags would be linked
+        # as is, the .deps of the precooked outputs point to the headers of
+        # its dependencies.
+        if self._precook_inputs is not None:
+            if self._precook_inputs != self._get_build_inputs():
+                self._discard_precook_outputs()
+            self._precook_inputs = None
+
 
         out = os.path.join(self.log_path, "configure.out")
         err = os.path.join(self.log_path, "configure.err")
         env_file = os.path.join(self.log_path, "configure.env")
 
         env = self.get_env()
+        pass_fds = Jobserver.share(env)
 
         with open(env_file, 'w') as tmp:
             pprint.pprint(env, stream=tmp)
 
-        os.chdir(self.source_path)
         args = ['./configure']
         prefix = '--prefix={}'.format(self.installation_path)
         args.append(prefix)
         args.extend(self.custom_configure_flags)
 
+        shared_cache = self._get_configure_cache_path()
+        private_cache = os.path.join(self.log_path, "config.cache")
+        if shared_cache is not None:
+            with file_lock(shared_cache + ".lock"):
+                if os.path.exists(shared_cache):
+                    shutil.copyfile(shared_cache, private_cache)
+            args.append('--cache-file={}'.format(private_cache))
+
         # TODO: log output and add INFO log point
-        with open(out, 'w') as stdout, open(err, 'w') as stderr:
+        with open(out, 'w') as stdout, open(err, 'w') as stderr, \
+                Jobserver.slot():
             p = subprocess.run(args, env=env, stdout=stdout,
-                               stderr=stderr)
+                               stderr=stderr, cwd=self.source_path,
+                               pass_fds=pass_fds)
         p.check_returncode()
+
+        if shared_cache is not None:
+            self._merge_configure_cache(private_cache, shared_cache)
+
         self.isConfigured = True
         return p
 
+    def _get_configure_cache_path(self):
+        """
+        Return the path of the autoconf cache file shared by configure runs
+        of the same project using the same toolchain and dependencies, or
+        None when no cache must be used.
+        """
+        # Projects configured against a fresh dependency are usually testing
+        # configure checks, cached results would defeat them.
+        for key, dep in self.dependencies.items():
+            if not dep._immutable:
+                return None
+
+        # Cached results of project specific checks (ac_cv_* variables named
+        # after the project, AC_CACHE_CHECK of its own features) must not
+        # leak into other projects.
+        inputs = [type(self).__name__, get_compiler_version()]
+        inputs.extend(flag for flag in self.custom_configure_flags
+                      if flag.startswith(("CC=", "CXX=", "CFLAGS=")))
+        inputs.extend(os.environ.get(var, "") for var in
+                      ["CC", "CXX", "CFLAGS", "CPPFLAGS", "LDFLAGS",
+                       "PKG_CONFIG_PATH"])
+        inputs.extend(sorted(dep.get_pkg_config_path()
+                             for dep in self.dependencies.values()))
+        key = hashlib.sha256("\n".join(inputs).encode('utf8')).hexdigest()
+
+        os.makedirs(Settings.configure_cache_folder, exist_ok=True)
+        return os.path.join(Settings.configure_cache_folder, key + ".cache")
+
+    def _merge_configure_cache(self, private_cache, shared_cache):
+        """
+        Merge the results of a configure run into the shared cache. Precious
+        variables (ac_cv_env_*) are project specific and are not shared.
+        """
+        with file_lock(shared_cache + ".lock"):
+            lines = _read_configure_cache(shared_cache)
+            for name, line in _read_configure_cache(private_cache).items():
+                if not name.startswith("ac_cv_env_"):
+                    lines[name] = line
+
+            tmp_path = "{}.{}".format(shared_cache, os.getpid())
+            with open(tmp_path, 'w') as cache:
+                cache.writelines(lines[name] for name in sorted(lines))
+            os.replace(tmp_path, shared_cache)
+
     def build(self):
         """
-        Build the project. Raise subprocess.CalledProcessError on build
-        error.
+        Build the project using the make jobserver of the harness, or one make
+        job per usable cpu without one. Raise subprocess.CalledProcessError
+        on build error.
         """
         if self._immutable:
             raise Exception("Object is immutable. Illegal build")
@@ -280,21 +608,25 @@ class Project(object):
         out = os.path.join(self.log_path, "build.out")
         err = os.path.join(self.log_path, "build.err")
 
-        os.chdir(self.source_path)
         args = ['make']
         env = self.get_env()
-
-        # Number of usable cpu
-        # https://docs.python.org/3/library/os.html#os.cpu_count
-        num_cpu = str(len(os.sched_getaffinity(0)))
-        args.append('-j')
-        args.append(num_cpu)
+        pass_fds = Jobserver.share(env)
+
+        # The jobserver dictates parallelism, an explicit -j would bypass it.
+        if not pass_fds:
+            # Number of usable cpu
+            # https://docs.python.org/3/library/os.html#os.cpu_count
+            num_cpu = str(len(os.sched_getaffinity(0)))
+            args.append('-j')
+            args.append(num_cpu)
         args.append('V=1')
 
         # TODO: log output and add INFO log point with args
-        with open(out, 'w') as stdout, open(err, 'w') as stderr:
+        with open(out, 'w') as stdout, open(err, 'w') as stderr, \
+                Jobserver.slot():
             p = subprocess.run(args, env=env, stdout=stdout,
-                               stderr=stderr)
+                               stderr=stderr, cwd=self.source_path,
+                               pass_fds=pass_fds)
         p.check_returncode()
         self.isBuilt = True
         return p
@@ -310,59 +642,102 @@ class Project(object):
         out = os.path.join(self.log_path, "install.out")
         err = os.path.join(self.log_path, "install.err")
 
-        os.chdir(self.source_path)
         args = ['make', 'install']
+        env = self.get_env()
+        pass_fds = Jobserver.share(env)
 
         # TODO: log output and add INFO log point
-        with open(out, 'w') as stdout, open(err, 'w') as stderr:
-            p = subprocess.run(args, env=self.get_env(), stdout=stdout,
-                               stderr=stderr)
+        with open(out, 'w') as stdout, open(err, 'w') as stderr, \
+                Jobserver.slot():
+            p = subprocess.run(args, env=env, stdout=stdout,
+                               stderr=stderr, cwd=self.source_path,
+                               pass_fds=pass_fds)
         p.check_returncode()
 
         # For babeltrace2, create a symlink to babeltrace for backward compat
         bt1_path = os.path.join(self.installation_path, "bin/babeltrace");
         bt2_path = os.path.join(self.installation_path, "bin/babeltrace2");
         if os.path.exists(bt2_path):
+            # A materialized installation already has one, to the precooked
+            # babeltrace2.
+            if os.path.lexists(bt1_path):
+                os.unlink(bt1_path)
             os.symlink(bt2_path, bt1_path)
 
         self.isInstalled = True
         return p
 
     def rpath_strip(self):
+        """
+        Remove the rpath of all ELF files installed under bin and lib. Raise
+        Elf.ElfError if a file could not be processed.
+        """
         to_strip = [os.path.join(self.installation_path, "bin"),
                     os.path.join(self.installation_path, "lib")]
 
         out = os.path.join(self.log_path, "rpath-strip.out")
         err = os.path.join(self.log_path, "rpath-strip.err")
 
+        paths = []
         for path in to_strip:
             for base, dirs, files in os.walk(path):
                 for tmp in files:
                     abs_path = os.path.abspath(os.path.join(base, tmp))
-                    magic_str = magic.from_file(abs_path)
-                    # Skip all non-elf file
-                    if "ELF" not in magic_str.split():
-                        with open(err, 'a') as stderr:
-                            stderr.write("{} skip, is not an ELF, file type: {}\n".format(abs_path, magic_str))
-                        continue
-                    cmd = ["chrpath", "-d", abs_path]
-                    with open(out, 'a') as stdout, open(err, 'a') as stderr:
-                        stdout.write("Running {}\n".format(cmd))
-                        stderr.write("Running {}\n".format(cmd))
-                        p = subprocess.run(cmd, stdout=stdout, stderr=stderr)
-                        p.check_returncode()
-
-    def cleanup(self):
-        if os.path.exists(self.source_path):
-            shutil.rmtree(self.source_path)
-        if os.path.exists(self.installation_path):
-            shutil.rmtree(self.installation_path)
+                    # Symlinked files are processed through their target
+                    if not os.path.islink(abs_path):
+                        paths.append(abs_path)
+
+        failed = []
+        out_lines = []
+        err_lines = []
+        for abs_path, removed, error in Elf.strip_rpath_files(paths):
+            if error is not None:
+                failed.append(abs_path)
+                err_lines.append("{} failed: {}\n".format(abs_path, error))
+            elif removed is None:
+                err_lines.append("{} skip, is not an ELF\n".format(abs_path))
+            else:
+                out_lines.append("{} removed {} rpath entries\n".format(
+                    abs_path, len(removed)))
+
+        with open(out, 'w') as stdout, open(err, 'w') as stderr:
+            stdout.writelines(out_lines)
+            stderr.writelines(err_lines)
+
+        if failed:
+            raise Elf.ElfError("Rpath stripping failed for {}".format(failed))
+
+    def to_manifest(self):
+        """
+        Return a dictionary describing the project. Dependencies are referenced
+        by label.
+        """
+        manifest = {attr: getattr(self, attr)
+                    for attr in self._manifest_attributes}
+        manifest['deps'] = {key: dep.label
+                            for key, dep in self.dependencies.items()}
+        return manifest
+
+    @classmethod
+    def from_manifest(cls, manifest, dependencies):
+        """
+        Return an immutable project from its manifest without checking it out.
+        dependencies is a dictionary of project name to Project.
+        """
+        project = cls.__new__(cls)
+        for attr in cls._manifest_attributes:
+            setattr(project, attr, manifest[attr])
+        project.dependencies = dependencies
+        project._immutable = True
+        project._build_key = None
+        return project
 
 
 class Lttng_modules(Project):
-    def __init__(self, label, git_path, sha1, tmpdir):
+    def __init__(self, label, git_path, sha1, tmpdir, precook=None):
         super(Lttng_modules, self).__init__(label=label, git_path=git_path,
-                                            sha1=sha1, tmpdir=tmpdir)
+                                            sha1=sha1, tmpdir=tmpdir,
+                                            precook=precook)
         self.add_special_env_variable("MODPROBE_OPTIONS","-v -d {}".format(self.installation_path))
 
     def bootstrap(self):
@@ -374,11 +749,14 @@ class Lttng_modules(Project):
     def install(self):
         if self._immutable:
             raise Exception("Object is immutable. Illegal install")
-        os.chdir(self.source_path)
         args = ['make', 'INSTALL_MOD_PATH={}'.format(self.installation_path),
                 'modules_install']
-        p = subprocess.run(args, env=self.get_env(), stdout=subprocess.PIPE,
-                           stderr=subprocess.PIPE)
+        env = self.get_env()
+        pass_fds = Jobserver.share(env)
+        with Jobserver.slot():
+            p = subprocess.run(args, env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, cwd=self.source_path,
+                               pass_fds=pass_fds)
         p.check_returncode()
 
         # Perform a local depmod
@@ -399,18 +777,24 @@ class Lttng_modules(Project):
 
 
 class Lttng_ust(Project):
-    def __init__(self, label, git_path, sha1, tmpdir):
+    def __init__(self, label, git_path, sha1, tmpdir, precook=None):
         super(Lttng_ust, self).__init__(label=label, git_path=git_path,
-                                        sha1=sha1, tmpdir=tmpdir)
-        self.custom_configure_flags.extend(['--disable-man-pages'])
-        self.custom_configure_flags.extend(['--enable-python-agent'])
-        self.custom_configure_flags.extend(['--enable-java-agent-jul'])
+                                        sha1=sha1, tmpdir=tmpdir,
+                                        precook=precook)
 
         jul_path = os.path.join(self.installation_path,
                 "share/java/liblttng-ust-agent.jar")
         classpath = ":".join([jul_path, '.'])
         self.add_special_env_variable("CLASSPATH", classpath)
 
+    @classmethod
+    def get_default_configure_flags(cls):
+        flags = super(Lttng_ust, cls).get_default_configure_flags()
+        flags.extend(['--disable-man-pages'])
+        flags.extend(['--enable-python-agent'])
+        flags.extend(['--enable-java-agent-jul'])
+        return flags
+
     def install(self):
         super(Lttng_ust, self).install()
         python_path = find_dir(self.installation_path, "lttngust")
@@ -422,9 +806,12 @@ class Lttng_ust(Project):
 
 
 class Lttng_tools(Project):
-    def __init__(self, label, git_path, sha1, tmpdir):
+    _manifest_attributes = Project._manifest_attributes + ['mi_xsd']
+
+    def __init__(self, label, git_path, sha1, tmpdir, precook=None):
         super(Lttng_tools, self).__init__(label=label, git_path=git_path,
-                                        sha1=sha1, tmpdir=tmpdir)
+                                        sha1=sha1, tmpdir=tmpdir,
+                                        precook=precook)
         self.add_special_env_variable("LTTNG_SESSION_CONFIG_XSD_PATH",
                 os.path.join(self.installation_path, "share/xml/lttng/"))
 
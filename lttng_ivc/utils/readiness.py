@@ -0,0 +1,294 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import ctypes
+import select
+import time
+import socket
+import asyncio
+import logging
+
+_logger = logging.getLogger('runtime.readiness')
+
+# inotify(7) flags and events
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+# Bounds of the polling interval used when inotify is not available
+_backoff_start = 0.001
+_backoff_max = 0.1
+
+try:
+    _libc = ctypes.CDLL(None, use_errno=True)
+    _inotify_init1 = _libc.inotify_init1
+    _inotify_init1.argtypes = [ctypes.c_int]
+    _inotify_add_watch = _libc.inotify_add_watch
+    _inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                   ctypes.c_uint32]
+except (OSError, AttributeError):
+    _inotify_init1 = None
+
+
+class ReadinessError(Exception):
+    pass
+
+
+class ExitedError(ReadinessError):
+    """
+    The process expected to get ready exited.
+    """
+    pass
+
+
+class Watcher(object):
+    """
+    Wait for changes on watched paths, the exit of a process or a timeout.
+
+    Changes are reported by inotify when available. Otherwise wait() returns
+    after an exponential backoff, the caller checks its condition after each
+    wait either way.
+    """
+
+    def __init__(self):
+        self._fd = None
+        self._delay = _backoff_start
+        if _inotify_init1 is not None:
+            fd = _inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+            else:
+                _logger.debug("inotify unavailable: {}".format(
+                    os.strerror(ctypes.get_errno())))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def add_watch(self, path, mask):
+        """
+        Watch path for events of mask. Return False if changes on path are
+        not reported, waits then fall back to polling.
+        """
+        if self._fd is None:
+            return False
+        wd = _inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            _logger.debug("Cannot watch {}: {}".format(
+                path, os.strerror(ctypes.get_errno())))
+            self.close()
+            return False
+        return True
+
+    def _drain(self):
+        # Events are not inspected, the caller checks its condition again
+        while True:
+            try:
+                if not os.read(self._fd, 4096):
+                    return
+            except BlockingIOError:
+                return
+
+    def _next_delay(self, timeout):
+        delay = self._delay
+        self._delay = min(self._delay * 2, _backoff_max)
+        return delay if timeout is None else min(delay, timeout)
+
+    def wait(self, timeout=None):
+        """
+        Block until a change or for at most timeout seconds.
+        """
+        if self._fd is None:
+            time.sleep(self._next_delay(timeout))
+            return
+        select.select([self._fd], [], [], timeout)
+        self._drain()
+
+    async def async_wait(self, timeout=None, process=None):
+        """
+        Wait until a change, the exit of process, an asyncio subprocess, or
+        for at most timeout seconds.
+        """
+        loop = asyncio.get_running_loop()
+        waiters = []
+        changed = None
+        if self._fd is None:
+            waiters.append(asyncio.ensure_future(
+                asyncio.sleep(self._next_delay(timeout))))
+        else:
+            changed = loop.create_future()
+            loop.add_reader(self._fd, lambda: changed.done() or
+                            changed.set_result(None))
+            waiters.append(changed)
+        if process is not None:
+            waiters.append(asyncio.ensure_future(process.wait()))
+        try:
+            await asyncio.wait(waiters, timeout=timeout,
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if changed is not None:
+                loop.remove_reader(self._fd)
+                self._drain()
+            for waiter in waiters:
+                waiter.cancel()
+
+
+def _check_process(process, what):
+    if process is not None and process.returncode is not None:
+        raise ExitedError("Process exited with {} while waiting for {}".format(
+            process.returncode, what))
+
+
+async def wait_for_cue(path, cue, timeout=60, process=None):
+    """
+    Wait for cue to be written to the file at path. Raise ReadinessError if
+    process, the asyncio subprocess writing it, exits or timeout expires
+    first.
+
+    The file is followed from the offset of the last read, keeping enough of
+    the previous content to match a cue split across writes.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    cue_data = cue.encode('utf8')
+    offset = 0
+    tail = b""
+    with Watcher() as watcher, open(path, 'rb') as log:
+        watcher.add_watch(path, IN_MODIFY)
+        while True:
+            # Sample the process state first, what it wrote before exiting is
+            # then read below.
+            exited = process is not None and process.returncode is not None
+            log.seek(offset)
+            data = log.read()
+            offset += len(data)
+            if cue_data in tail + data:
+                return
+            tail = (tail + data)[-len(cue_data):]
+            if exited:
+                _check_process(process, "{} in {}".format(cue, path))
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise ReadinessError("{} not found in {} after {}s".format(
+                    cue, path, timeout))
+            await watcher.async_wait(remaining, process)
+
+
+async def wait_for_notification(fd, what, timeout=60):
+    """
+    Wait for a byte on fd, the read end of a pipe. Raise ReadinessError on end
+    of file, once all writers exited without notifying, or if timeout
+    expires first.
+    """
+    loop = asyncio.get_running_loop()
+    readable = loop.create_future()
+    loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+    try:
+        await asyncio.wait_for(readable, timeout)
+    except asyncio.TimeoutError:
+        raise ReadinessError("No notification of {} after {}s".format(
+            what, timeout))
+    finally:
+        loop.remove_reader(fd)
+    if not os.read(fd, 1):
+        raise ExitedError("Exited without notification of {}".format(what))
+
+
+def wait_for_file(path, timeout=60):
+    """
+    Wait for path to exist. Raise ReadinessError if timeout expires first.
+    """
+    deadline = time.monotonic() + timeout
+    with Watcher() as watcher:
+        watcher.add_watch(os.path.dirname(path) or ".",
+                          IN_CREATE | IN_MOVED_TO)
+        while not os.path.exists(path):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ReadinessError("{} does not exist after {}s".format(
+                    path, timeout))
+            watcher.wait(remaining)
+
+
+async def async_wait_for_file(path, timeout=60, process=None):
+    """
+    Wait for path to exist. Raise ReadinessError if process, the asyncio
+    subprocess expected to create it, exits or timeout expires first.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    with Watcher() as watcher:
+        watcher.add_watch(os.path.dirname(path) or ".",
+                          IN_CREATE | IN_MOVED_TO)
+        while True:
+            exited = process is not None and process.returncode is not None
+            if os.path.exists(path):
+                return
+            if exited:
+                _check_process(process, path)
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise ReadinessError("{} does not exist after {}s".format(
+                    path, timeout))
+            await watcher.async_wait(remaining, process)
+
+
+async def wait_for_port(port, host="localhost", timeout=60, process=None):
+    """
+    Wait for a TCP port to accept connections. Raise ReadinessError if
+    process, the asyncio subprocess expected to listen, exits or timeout
+    expires first.
+
+    A probe connection is visible to the listener, do not use it on a port
+    whose connections are part of the test.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = _backoff_start
+    while True:
+        _check_process(process, "port {}".format(port))
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except socket.gaierror:
+            raise
+        except OSError:
+            # Refused, possibly on each address of host
+            pass
+        else:
+            writer.close()
+            return
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            raise ReadinessError("Port {} not connectable after {}s".format(
+                port, timeout))
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, _backoff_max)
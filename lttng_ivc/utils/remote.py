@@ -0,0 +1,126 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import logging
+
+from git import Repo, Git
+
+_logger = logging.getLogger('setup.git')
+
+
+def get_advertised_refs(url):
+    """
+    Return a dictionary of reference name to sha1 advertised by the remote.
+    """
+    refs = {}
+    for line in Git().ls_remote(url).splitlines():
+        sha1, name = line.split('\t')
+        refs[name] = sha1
+    return refs
+
+
+def get_local_refs(repo):
+    """
+    Return a dictionary of reference name to a tuple of (sha1, peeled sha1)
+    in a single call. The peeled sha1 is empty for non annotated tags.
+    """
+    refs = {}
+    output = repo.git.for_each_ref(format='%(refname) %(objectname) %(*objectname)')
+    for line in output.splitlines():
+        fields = line.split(' ')
+        refs[fields[0]] = (fields[1], fields[2])
+    return refs
+
+
+def is_up_to_date(repo, url, refs):
+    """
+    Check if the local references already match the ones advertised by the
+    remote for the given refs (branch, tag or commit names).
+    """
+    advertised = get_advertised_refs(url)
+    local = get_local_refs(repo)
+    for ref in refs:
+        branch = 'refs/heads/' + ref
+        tag = 'refs/tags/' + ref
+        if branch in advertised:
+            local_ref = local.get('refs/remotes/{}/{}'.format(repo.remote().name, ref))
+            if local_ref is None or local_ref[0] != advertised[branch]:
+                return False
+        elif tag in advertised:
+            local_ref = local.get(tag)
+            if local_ref is None or local_ref[0] != advertised[tag]:
+                return False
+        else:
+            try:
+                repo.commit(ref)
+            except Exception:
+                return False
+    return True
+
+
+def update_remote(url, path, refs):
+    """
+    Clone or fetch the remote url into path. The fetch is skipped when the
+    references used by the markers are already up to date.
+    """
+    if os.path.exists(path):
+        if not os.path.isdir(path):
+            raise Exception('Remote path {} exists and is not a folder'.format(path))
+        repo = Repo(path)
+        if is_up_to_date(repo, url, refs):
+            _logger.info('Remote {} is up to date'.format(url))
+        else:
+            _logger.info('Fetching {}'.format(url))
+            # TODO: might be necessary to actually update the base branch, to validate
+            repo.remote().fetch()
+    else:
+        _logger.info('Cloning {}'.format(url))
+        repo = Repo.clone_from(url, path)
+
+    # Project checkouts borrow objects from this repository through git
+    # alternates, never prune objects they might still reference.
+    with repo.config_writer() as config:
+        config.set_value('gc', 'pruneExpire', 'never')
+
+
+def resolve_refs(repo, refs):
+    """
+    Resolve references in a batch. Return a dictionary of ref to commit sha1,
+    unresolvable references are absent. Branches take precedence over tags and
+    tags over commits.
+    """
+    local = get_local_refs(repo)
+    resolved = {}
+    for ref in refs:
+        branch = local.get('refs/remotes/{}/{}'.format(repo.remote().name, ref))
+        tag = local.get('refs/tags/' + ref)
+        if branch is not None:
+            resolved[ref] = branch[0]
+        elif tag is not None:
+            # Peeled sha1 of annotated tags
+            resolved[ref] = tag[1] or tag[0]
+        else:
+            try:
+                resolved[ref] = repo.commit(ref).hexsha
+            except Exception:
+                pass
+    return resolved
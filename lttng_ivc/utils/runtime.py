@@ -26,9 +26,15 @@ import uuid
 import logging
 import shutil
 import contextlib
+import fcntl
 import pprint
 import signal
-import textwrap
+import errno
+import weakref
+import hashlib
+import tempfile
+import asyncio
+import threading
 
 from pprint import pformat
 
@@ -36,19 +42,166 @@ from tempfile import TemporaryDirectory
 
 import lttng_ivc.settings as Settings
 import lttng_ivc.utils.utils as utils
+import lttng_ivc.utils.jobserver as Jobserver
+import lttng_ivc.utils.java_cds as JavaCds
+import lttng_ivc.utils.readiness as Readiness
 _logger = logging.getLogger("Runtime")
 
+# Environment variables influencing the build of a test application
+_app_build_env_variables = ["CC", "CFLAGS", "CPPFLAGS", "LDFLAGS", "CPATH",
+                            "C_INCLUDE_PATH", "LIBRARY_PATH"]
+
 class SubProcessError(Exception):
     pass
 
 
+# Maximum size of a read on an output pipe and of a partial line held for the
+# aggregated log.
+_read_size = 65536
+
+# Event loop of each thread driving the subprocesses of its runtimes
+_loops = threading.local()
+
+
+def get_event_loop():
+    """
+    Return the event loop of the calling thread. All runtimes of a thread
+    share it so that their coroutines can be awaited together.
+    """
+    loop = getattr(_loops, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _loops.loop = loop
+    return loop
+
+
+def run_until_complete(awaitable):
+    return get_event_loop().run_until_complete(awaitable)
+
+
+def run_concurrently(*awaitables):
+    """
+    Run awaitables, e.g. coroutines of the async Runtime methods, concurrently
+    and return the list of their results. All of them run to completion, the
+    first exception raised is then propagated.
+    """
+    async def gather():
+        return await asyncio.gather(*awaitables, return_exceptions=True)
+
+    results = run_until_complete(gather())
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+async def _tee(process, outputs, log, timeout=None):
+    """
+    Copy the output streams of process to their file and to the aggregated
+    log as they come, lines prefixed by the stream name. outputs is a
+    dictionary of stream reader to a tuple of (file, stream name).
+
+    Return once the process exited and its streams reached end of file or, if
+    a child process kept them open, once no data is pending. Kill the process
+    and raise subprocess.TimeoutExpired if timeout expires.
+    """
+    partial = {stream: b"" for stream in outputs}
+    reads = [0]
+
+    def write_lines(stream, data, flush=False):
+        lines = (partial[stream] + data).split(b"\n")
+        partial[stream] = lines.pop()
+        if flush or len(partial[stream]) >= _read_size:
+            if partial[stream]:
+                lines.append(partial[stream])
+            partial[stream] = b""
+        name = outputs[stream][1]
+        for line in lines:
+            log.write(b"    " + name + b": " + line + b"\n")
+
+    async def copy(stream):
+        while True:
+            data = await stream.read(_read_size)
+            if not data:
+                return
+            reads[0] += 1
+            outputs[stream][0].write(data)
+            write_lines(stream, data)
+
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    # Process.wait() also waits for the streams to be closed, the return code
+    # is polled instead so that a pipe leaked to a child process does not
+    # hold the command.
+    pending = [asyncio.ensure_future(copy(stream)) for stream in outputs]
+    copies = list(pending)
+    timed_out = False
+    try:
+        while pending:
+            exited = process.returncode is not None
+            wait = 0.1
+            if deadline is not None and not exited:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    # Kill then drain what is left
+                    process.kill()
+                    timed_out = True
+                    deadline = None
+                else:
+                    wait = min(wait, remaining)
+
+            count = reads[0]
+            done, pending = await asyncio.wait(pending, timeout=wait)
+            if exited and count == reads[0]:
+                break
+    finally:
+        for task in copies:
+            task.cancel()
+        await asyncio.gather(*copies, return_exceptions=True)
+        for stream in outputs:
+            write_lines(stream, b"", flush=True)
+    if timed_out:
+        raise subprocess.TimeoutExpired(process.args, timeout)
+    return await process.wait() if not pending else process.returncode
+
+
+def _deduplicate(value, delimiter):
+    """
+    Remove repeated and empty entries of a delimited list, keeping the first
+    occurrence.
+    """
+    entries = []
+    for entry in value.split(delimiter):
+        if entry and entry not in entries:
+            entries.append(entry)
+    return delimiter.join(entries)
+
+
 @contextlib.contextmanager
 def get_runtime(runtime_dir):
     runtime = Runtime(runtime_dir)
+    failed = True
     try:
         yield runtime
+        failed = False
     finally:
-        runtime.close()
+        runtime.close(failed)
+
+
+# Runtimes not closed yet, their lttng_home may be shared
+_open_runtimes = weakref.WeakSet()
+
+_retention_modes = ["always", "on-failure", "logs-only"]
+
+
+def _is_trace_stream(lttng_home, path):
+    """
+    Return True if path, relative to lttng_home, is a trace stream file,
+    i.e. a file other than the metadata of a CTF trace folder.
+    """
+    folder, name = os.path.split(path)
+    return (name != "metadata" and
+            os.path.exists(os.path.join(lttng_home, folder, "metadata")))
 
 
 class Runtime(object):
@@ -61,6 +214,11 @@ class Runtime(object):
         self.__stdout_stderr = {}
         self.__projects = []
 
+        # Memoized environment and the TrackedDict generation it was
+        # computed at
+        self.__env = None
+        self.__env_generation = None
+
         self.__runtime_log = os.path.join(runtime_dir, "log")
         self.__runtime_log_sub = os.path.join(self.__runtime_log, "subprocess")
 
@@ -92,51 +250,104 @@ class Runtime(object):
 
         os.makedirs(self.__runtime_log)
         os.makedirs(self.__runtime_log_sub)
+        _open_runtimes.add(self)
+
+    @property
+    def lttng_home(self):
+        return self.__lttng_home
+
+    @lttng_home.setter
+    def lttng_home(self, value):
+        self.__lttng_home = value
+        self.__env = None
+
+    @property
+    def special_env_variables(self):
+        return self.__special_env_variables
+
+    @special_env_variables.setter
+    def special_env_variables(self, value):
+        self.__special_env_variables = utils.TrackedDict(value)
+        self.__env = None
 
     def add_project(self, project):
         self.__projects.append(project)
+        self.__env = None
 
     def remove_project(self, project):
         self.__projects.remove(project)
+        self.__env = None
 
     def subprocess_signal(self, subprocess_uuid, signal):
         self.__subprocess[subprocess_uuid].send_signal(signal)
 
+    def run_until_complete(self, awaitable):
+        return run_until_complete(awaitable)
+
     def subprocess_terminate(self, subprocess_uuid, timeout=60, check_return=True):
+        return run_until_complete(self.async_subprocess_terminate(
+            subprocess_uuid, timeout, check_return))
+
+    async def async_subprocess_terminate(self, subprocess_uuid, timeout=60,
+                                         check_return=True):
         process = self.__subprocess[subprocess_uuid]
-        process.terminate()
+        if process.returncode is None:
+            process.terminate()
         try:
-            process.wait(timeout)
-        except subprocess.TimeoutExpired:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
             # Force kill
-            return self.subprocess_kill(subprocess_uuid)
-        stdout, stderr = self.__stdout_stderr[subprocess_uuid]
-        stdout.close()
-        stderr.close()
+            return await self.async_subprocess_kill(subprocess_uuid)
+        self._close_subprocess_outputs(subprocess_uuid)
         if check_return:
             if process.returncode != 0:
                 raise subprocess.CalledProcessError(process.returncode, process.args)
-        return process
+        return subprocess.CompletedProcess(process.args, process.returncode)
 
     def subprocess_kill(self, subprocess_uuid):
+        return run_until_complete(self.async_subprocess_kill(subprocess_uuid))
+
+    async def async_subprocess_kill(self, subprocess_uuid):
         process = self.__subprocess[subprocess_uuid]
-        os.killpg(os.getpgid(process.pid), signal.SIGKILL);
-        process.wait()
-        stdout, stderr = self.__stdout_stderr[subprocess_uuid]
-        stdout.close()
-        stderr.close()
-        return process
+        # The process leads its own session, see async_spawn_subprocess
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        self._close_subprocess_outputs(subprocess_uuid)
+        return subprocess.CompletedProcess(process.args, process.returncode)
 
     def subprocess_wait(self, subprocess_uuid, check_return=True):
+        return run_until_complete(self.async_subprocess_wait(subprocess_uuid,
+                                                             check_return))
+
+    async def async_subprocess_wait(self, subprocess_uuid, check_return=True):
         process = self.__subprocess[subprocess_uuid]
-        process.wait()
-        stdout, stderr = self.__stdout_stderr[subprocess_uuid]
-        stdout.close()
-        stderr.close()
+        await process.wait()
+        self._close_subprocess_outputs(subprocess_uuid)
         if check_return:
             if process.returncode != 0:
                 raise subprocess.CalledProcessError(process.returncode, process.args)
-        return process
+        return subprocess.CompletedProcess(process.args, process.returncode)
+
+    def discard_subprocess(self, subprocess_uuid):
+        return run_until_complete(self.async_discard_subprocess(
+            subprocess_uuid))
+
+    async def async_discard_subprocess(self, subprocess_uuid):
+        """
+        Wait for a subprocess and stop tracking it, e.g. a failed attempt that
+        is retried. Its return code is not checked on close, its logs are
+        kept.
+        """
+        await self.async_subprocess_wait(subprocess_uuid, check_return=False)
+        del self.__subprocess[subprocess_uuid]
+
+    def _close_subprocess_outputs(self, subprocess_uuid):
+        stdout, stderr = self.__stdout_stderr[subprocess_uuid]
+        stdout.close()
+        stderr.close()
 
     def get_subprocess_stdout_path(self, subprocess_uuid):
         stdout, stderr = self.__stdout_stderr[subprocess_uuid]
@@ -146,7 +357,18 @@ class Runtime(object):
         stdout, stderr = self.__stdout_stderr[subprocess_uuid]
         return stderr.name
 
-    def spawn_subprocess(self, command_line, cwd=None):
+    def spawn_subprocess(self, command_line, cwd=None, pass_fds=(),
+                         launcher=None):
+        return run_until_complete(self.async_spawn_subprocess(
+            command_line, cwd, pass_fds, launcher))
+
+    async def async_spawn_subprocess(self, command_line, cwd=None,
+                                     pass_fds=(), launcher=None):
+        """
+        Spawn command_line and return its identifier. pass_fds are inherited
+        by the subprocess. launcher is a list of arguments prepended to the
+        command, e.g. a helper supervising it.
+        """
         args = shlex.split(command_line)
         env = self.get_env()
 
@@ -162,12 +384,19 @@ class Runtime(object):
         stderr = open(err_path, 'w')
 
         env_path = os.path.join(self.__runtime_log_sub, str(tmp_id) + ".env")
-        with open(env_path, 'w') as env_out:
-            pprint.pprint(env, stream=env_out)
+        os.symlink(os.path.relpath(self._dump_env(env), self.__runtime_log_sub),
+                   env_path)
         with open(command_path, 'w') as cmdline_out:
             pprint.pprint(args, stream=cmdline_out)
 
-        p = subprocess.Popen(args, stdout=stdout, stderr=stderr, env=env, cwd=cwd, preexec_fn=os.setsid)
+        popen_args = (launcher or []) + args
+        p = await asyncio.create_subprocess_exec(*popen_args, stdout=stdout,
+                                                 stderr=stderr, env=env,
+                                                 cwd=cwd, pass_fds=pass_fds,
+                                                 start_new_session=True)
+        # Mirror subprocess.Popen for error reporting, naming the command
+        # rather than its launcher
+        p.args = args
         self.__subprocess[tmp_id] = p
         self.__stdout_stderr[tmp_id] = (stdout, stderr)
         _logger.debug("Spawned sub pid: {} args: {} stdout: {} stderr{}".format(p.pid, p.args, out_path, err_path))
@@ -180,6 +409,14 @@ class Runtime(object):
         stderr_path). The subprocess is already executed and returned. The
         callecaller is responsible for checking for errors.
         """
+        return run_until_complete(self.async_run(
+            command_line, cwd=cwd, check_return=check_return,
+            ld_preload=ld_preload, classpath=classpath, timeout=timeout,
+            ld_debug=ld_debug, gdbserver=gdbserver))
+
+    async def async_run(self, command_line, cwd=None, check_return=True,
+                        ld_preload="", classpath="", timeout=None,
+                        ld_debug=False, gdbserver=False):
         args = shlex.split(command_line)
         env = self.get_env()
 
@@ -196,44 +433,225 @@ class Runtime(object):
             args = cmd + args
             _logger.warning("Starting gdbserver: {}".format(pprint.pformat(args)))
 
+        pass_fds = ()
+        if os.path.basename(args[0]) == "make":
+            # Keep application builds within the harness make job budget
+            pass_fds = Jobserver.share(env)
+
+        class_list = None
+        if os.path.basename(args[0]) == "java":
+            # Start from a class data sharing archive of the agent under test
+            options, class_list = JavaCds.get_options(env)
+            args = args[:1] + options + args[1:]
+
         tmp_id = self._run_command_count
         self._run_command_count += 1
 
+        env_path = self._dump_env(env)
         cmd_map = os.path.join(self.__runtime_log, "cmd.map")
         with open(cmd_map, 'a') as out:
-            out.write("{}: {}\n".format(tmp_id, args))
+            out.write("{}: {} env: {}\n".format(tmp_id, args,
+                                                os.path.basename(env_path)))
 
         out_path = os.path.join(self.__runtime_log, str(tmp_id) + ".out")
         err_path = os.path.join(self.__runtime_log, str(tmp_id) + ".err")
-        stdout = open(out_path, "w")
-        stderr = open(err_path, "w")
-
-        env_path = os.path.join(self.__runtime_log, str(tmp_id) + ".env")
-        with open(env_path, 'w') as env_out:
-            for key, value in env.items():
-                env_out.write('{}={}\n'.format(key, value))
 
-        cp = subprocess.run(args, stdout=stdout, stderr=stderr, env=env,
-                            cwd=cwd, timeout=timeout)
+        # Output is written to the per command files and, as it comes, to the
+        # global log file. The per command files are left available for
+        # per-run analysis. Concurrent commands interleave their lines in the
+        # global log.
+        async with contextlib.AsyncExitStack() as stack:
+            if pass_fds:
+                # Hold the implicit job slot of the make
+                await stack.enter_async_context(Jobserver.async_slot())
+            stdout = stack.enter_context(open(out_path, "wb"))
+            stderr = stack.enter_context(open(err_path, "wb"))
+            log = stack.enter_context(
+                open(self._runtime_log_aggregation, "ab"))
+            log.write("Command #{}\nCommand: {}\n".format(
+                tmp_id, command_line).encode('utf8'))
+            p = await asyncio.create_subprocess_exec(
+                *args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                env=env, cwd=cwd, pass_fds=pass_fds)
+            p.args = args
+            try:
+                returncode = await _tee(p, {p.stdout: (stdout, b"stdout"),
+                                            p.stderr: (stderr, b"stderr")},
+                                        log, timeout=timeout)
+            finally:
+                log.write("Return value: {}\n\n".format(p.returncode).encode('utf8'))
+        cp = subprocess.CompletedProcess(args, returncode)
         _logger.debug("Command #{} args: {} stdout: {} stderr{}".format(tmp_id, cp.args, out_path, err_path))
 
-        # Add to the global log file. This can help a little. Leave the other
-        # file available for per-run analysis
-        with open(self._runtime_log_aggregation, "a") as log:
-            log.write("Command #{}\nReturn value: {}\nCommand: {}\n".format(tmp_id, cp.returncode, command_line))
-            with open(out_path, "r") as out:
-                log.write("STDOUT:\n".format(tmp_id, cp.returncode, command_line))
-                log.write(textwrap.indent(out.read(), '    '))
-            with open(err_path, "r") as out:
-                log.write("STDERR:\n".format(tmp_id, cp.returncode, command_line))
-                log.write(textwrap.indent(out.read(), '    '))
-            log.write("\n")
+        if class_list is not None:
+            JavaCds.dump(env, class_list)
 
         if check_return:
             cp.check_returncode()
 
         return (cp, out_path, err_path)
 
+    def wait_for_output(self, subprocess_uuid, cue, timeout=60,
+                        stream="stderr"):
+        return run_until_complete(self.async_wait_for_output(
+            subprocess_uuid, cue, timeout, stream))
+
+    async def async_wait_for_output(self, subprocess_uuid, cue, timeout=60,
+                                    stream="stderr"):
+        """
+        Wait for cue to appear on the stream, "stdout" or "stderr", of a
+        spawned subprocess. Raise Readiness.ReadinessError if the subprocess
+        exits or timeout expires first.
+        """
+        if stream == "stdout":
+            path = self.get_subprocess_stdout_path(subprocess_uuid)
+        else:
+            path = self.get_subprocess_stderr_path(subprocess_uuid)
+        await Readiness.wait_for_cue(path, cue, timeout,
+                                     self.__subprocess[subprocess_uuid])
+
+    def wait_for_file(self, path, subprocess_uuid=None, timeout=60):
+        return run_until_complete(self.async_wait_for_file(
+            path, subprocess_uuid, timeout))
+
+    async def async_wait_for_file(self, path, subprocess_uuid=None,
+                                  timeout=60):
+        """
+        Wait for path to be created, e.g. by the spawned subprocess
+        subprocess_uuid. Raise Readiness.ReadinessError if the subprocess
+        exits or timeout expires first.
+        """
+        process = None
+        if subprocess_uuid is not None:
+            process = self.__subprocess[subprocess_uuid]
+        await Readiness.async_wait_for_file(path, timeout, process)
+
+    def wait_for_port(self, port, host="localhost", subprocess_uuid=None,
+                      timeout=60):
+        return run_until_complete(self.async_wait_for_port(
+            port, host, subprocess_uuid, timeout))
+
+    async def async_wait_for_port(self, port, host="localhost",
+                                  subprocess_uuid=None, timeout=60):
+        """
+        Wait for a TCP port to accept connections, e.g. from the spawned
+        subprocess subprocess_uuid. Raise Readiness.ReadinessError if the
+        subprocess exits or timeout expires first.
+        """
+        process = None
+        if subprocess_uuid is not None:
+            process = self.__subprocess[subprocess_uuid]
+        await Readiness.wait_for_port(port, host, timeout, process)
+
+    def _dump_env(self, env):
+        """
+        Write env to the runtime log folder once per distinct environment and
+        return the path of the file.
+        """
+        content = "".join("{}={}\n".format(key, value)
+                          for key, value in sorted(env.items()))
+        digest = hashlib.sha256(content.encode('utf8')).hexdigest()[:16]
+        env_path = os.path.join(self.__runtime_log, "env-{}.env".format(digest))
+        if not os.path.exists(env_path):
+            with open(env_path, 'w') as env_out:
+                env_out.write(content)
+        return env_path
+
+    def build_app(self, app_folder, app_path, target="", fresh=False):
+        """
+        Build target of the application sources in app_folder using this
+        runtime and make the result available in app_path, populated with
+        the sources if absent.
+
+        Builds are cached per application sources, target and compilation
+        environment of the runtime. Cached build products are hard linked into
+        app_path. fresh forces a build in app_path, e.g. to exercise
+        compilation failures. Raise subprocess.CalledProcessError on build
+        failure.
+        """
+        return run_until_complete(self.async_build_app(app_folder, app_path,
+                                                       target, fresh))
+
+    async def async_build_app(self, app_folder, app_path, target="",
+                              fresh=False):
+        command_line = "make V=1 {}".format(target).strip()
+        env = self.get_env()
+        inputs = [utils.get_compiler_version()]
+        inputs.extend("{}={}".format(var, env.get(var))
+                      for var in _app_build_env_variables)
+        await self._build_cached(app_folder, app_path, command_line, inputs,
+                                 fresh)
+
+    def build_java_app(self, app_folder, app_path, fresh=False):
+        """
+        Compile App.java of app_folder against the agent jar of the runtime
+        CLASSPATH, see build_app.
+        """
+        return run_until_complete(self.async_build_java_app(app_folder,
+                                                            app_path, fresh))
+
+    async def async_build_java_app(self, app_folder, app_path, fresh=False):
+        env = self.get_env()
+        inputs = [JavaCds.get_version(env, "javac")]
+        for jar in JavaCds.get_classpath_jars(env):
+            inputs.append("{} {}".format(jar, utils.sha256_checksum(jar)))
+        await self._build_cached(app_folder, app_path, "javac App.java",
+                                 inputs, fresh)
+
+    async def _build_cached(self, app_folder, app_path, command_line, inputs,
+                            fresh):
+        """
+        Run the build command_line on a copy of app_folder, cached per
+        sources, command line and inputs, a list of strings describing the
+        build environment.
+        """
+        if not os.path.exists(app_path):
+            shutil.copytree(app_folder, app_path)
+        if fresh:
+            await self.async_run(command_line, cwd=app_path)
+            return
+
+        sha256 = hashlib.sha256()
+        sha256.update(command_line.encode('utf8'))
+        for value in inputs:
+            sha256.update("{}\n".format(value).encode('utf8'))
+        for root, dirs, files in os.walk(app_folder):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                sha256.update(os.path.relpath(path, app_folder).encode('utf8'))
+                sha256.update(utils.sha256_checksum(path).encode('utf8'))
+        key = sha256.hexdigest()
+
+        entry = os.path.join(Settings.apps_cache_folder, key)
+        os.makedirs(Settings.apps_cache_folder, exist_ok=True)
+        with open(entry + ".lock", 'a') as lock_file:
+            # Another worker may hold the lock for the length of a build, wait
+            # for it without blocking the other coroutines of the event loop.
+            await asyncio.get_running_loop().run_in_executor(
+                None, fcntl.flock, lock_file, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(entry):
+                    # Build out of the cache entry then publish it, a failed
+                    # build is not cached.
+                    tmp_dir = tempfile.mkdtemp(dir=Settings.apps_cache_folder)
+                    try:
+                        build_path = os.path.join(tmp_dir, "app")
+                        shutil.copytree(app_folder, build_path)
+                        await self.async_run(command_line, cwd=build_path)
+                        os.rename(build_path, entry)
+                    finally:
+                        shutil.rmtree(tmp_dir)
+                else:
+                    _logger.debug("Application {} {} served from {}".format(
+                        app_folder, command_line, entry))
+
+                utils.clone_tree(entry, app_path, hardlink=lambda path: True,
+                                 skip=lambda path: os.path.exists(
+                                     os.path.join(app_folder, path)))
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
     def get_cppflags(self):
         cppflags = []
         for project in self.__projects:
@@ -259,6 +677,20 @@ class Runtime(object):
         return ":".join(path)
 
     def get_env(self):
+        """
+        Return a copy of the environment of the runtime. It is computed once
+        and recomputed when projects are added or removed, when lttng_home
+        changes or when the special environment variables or dependencies of
+        the runtime or of any project change. Changes of os.environ made
+        afterwards are not seen.
+        """
+        generation = utils.get_tracked_generation()
+        if self.__env is None or generation != self.__env_generation:
+            self.__env = self._compute_env()
+            self.__env_generation = generation
+        return dict(self.__env)
+
+    def _compute_env(self):
         env = os.environ.copy()
 
         env["LTTNG_HOME"] = self.lttng_home
@@ -270,10 +702,11 @@ class Runtime(object):
                      "PATH": (self.get_bin_path(), ":"),
                      }
         for key, (value, delimiter) in env_fetch.items():
-            tmp_var = ""
-            if key in env:
-                tmp_var = env[key]
-            env[key] = delimiter.join([value, tmp_var])
+            # Projects share dependencies, only keep the first occurrence.
+            # The inherited value is kept as is. Empty parts are dropped, an
+            # empty path entry stands for the working directory.
+            tmp = [_deduplicate(value, delimiter), env.get(key, "")]
+            env[key] = delimiter.join(part for part in tmp if part)
 
         for var, value in self.special_env_variables.items():
             if var in env:
@@ -303,7 +736,12 @@ class Runtime(object):
         if self._is_test_modules_loaded:
             self.run("modprobe -r --remove-dependencies lttng-test lttng-statedump lttng_wrapper lttng_kprobes lttng_clock lttng_uprobes lttng_lib_ring_buffer lttng_kretprobes", check_return=check_return)
 
-    def close(self):
+    def close(self, failed=False):
+        """
+        Terminate the subprocesses and retain lttng_home as configured by
+        Settings.runtime_retention. failed tells whether the user of the
+        runtime failed, the failure of a subprocess also counts.
+        """
         throw = False
         subprocess_execeptions = [];
         for key, subp in self.__subprocess.items():
@@ -318,9 +756,45 @@ class Runtime(object):
         # value.
         self.unload_test_module(False)
 
-        # Hard linking would be nice here but it could be a problem when we use
-        # a tmpdir on another device. Let's consider we have unlimited space.
-        shutil.copytree(self.lttng_home, self.__post_runtime_lttng_home_path,
-                ignore=shutil.ignore_patterns(".lttng"))
+        _open_runtimes.discard(self)
+        self._retain_lttng_home(failed or throw)
         if throw:
             raise SubProcessError(subprocess_execeptions)
+
+    def _retain_lttng_home(self, failed):
+        mode = Settings.runtime_retention
+        if mode not in _retention_modes:
+            raise Exception("Unknown runtime retention {}, expected one of {}".format(
+                mode, _retention_modes))
+        if mode == "on-failure" and not failed:
+            return
+
+        src = self.lttng_home
+        dst = self.__post_runtime_lttng_home_path
+        shared = any(runtime.lttng_home == src for runtime in _open_runtimes)
+        moved = False
+        if mode != "logs-only" and not shared:
+            # Nothing uses lttng_home anymore, move it when on the same
+            # filesystem. An empty folder is left for the cleanup of the
+            # temporary directory.
+            try:
+                os.rename(src, dst)
+                os.mkdir(src)
+                moved = True
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+        if not moved:
+            # Files are reflinked or hard linked when possible, they are not
+            # modified once the daemons are terminated. The .lttng folder
+            # only holds sockets and pid files.
+            def skip(path):
+                if path.split(os.sep)[0] == ".lttng":
+                    return True
+                return mode == "logs-only" and _is_trace_stream(src, path)
+            utils.clone_tree(src, dst, hardlink=lambda path: True, skip=skip)
+        shutil.rmtree(os.path.join(dst, ".lttng"), ignore_errors=True)
+
+        if Settings.runtime_retention_compress:
+            shutil.make_archive(dst, "gztar", root_dir=dst)
+            shutil.rmtree(dst)
@@ -0,0 +1,105 @@
+# Copyright (c) 2017 Jonathan Rajotte-Julien <jonathan.rajotte-julien@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import logging
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+_logger = logging.getLogger('project.scheduler')
+
+
+def dependency_closure(graph, labels):
+    """
+    Return the set of labels and all their transitive dependencies. graph is
+    a dictionary of label to a list of dependency labels.
+    """
+    closure = set()
+    stack = list(labels)
+    while stack:
+        label = stack.pop()
+        if label in closure:
+            continue
+        closure.add(label)
+        stack.extend(graph[label])
+    return closure
+
+
+def schedule(graph, labels, build, workers=None):
+    """
+    Build labels and their dependencies concurrently using a pool of workers,
+    defaults to the number of usable cpu. Make parallelism is left to the
+    jobserver shared by the builds.
+
+    graph is a dictionary of label to a list of dependency labels and build a
+    callable taking a label. A label is submitted as soon as all its
+    dependencies are built.
+
+    Return the set of labels that failed to build or were not built due to a
+    failed dependency.
+    """
+    if workers is None:
+        workers = len(os.sched_getaffinity(0))
+
+    pending = dependency_closure(graph, labels)
+    done = set()
+    failed = set()
+    # Future to label
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            progress = False
+            ready = []
+            for label in sorted(pending):
+                deps = graph[label]
+                if any(dep in failed for dep in deps):
+                    _logger.error("{} not built since a dependency failed".format(label))
+                    failed.add(label)
+                    progress = True
+                elif all(dep in done for dep in deps):
+                    ready.append(label)
+            pending.difference_update(failed)
+
+            for label in ready[:workers - len(running)]:
+                _logger.info("Scheduling {}".format(label))
+                future = executor.submit(build, label)
+                running[future] = label
+                pending.remove(label)
+                progress = True
+
+            if not running:
+                if progress:
+                    continue
+                raise Exception("Dependency cycle between {}".format(sorted(pending)))
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                label = running.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    _logger.error("{} failed to build: {}".format(label, e))
+                    failed.add(label)
+                else:
+                    _logger.info("Done: {}".format(label))
+                    done.add(label)
+    return failed
@@ -18,18 +18,26 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import signal
 import hashlib
 import os
-import time
 import socket
 import re
 import sys
+import shlex
+import fcntl
+import errno
+import shutil
+import itertools
+import subprocess
 
 from typing import Pattern
-from contextlib import closing
+from contextlib import closing, contextmanager
 from lxml import etree
 
+import lttng_ivc.utils.readiness as Readiness
+import lttng_ivc.utils.notify_parent as NotifyParent
+import lttng_ivc.utils.ports as Ports
+
 
 def line_count(file_path):
     count = 0
@@ -47,16 +55,169 @@ def sha256_checksum(filename, block_size=65536):
     return sha256.hexdigest()
 
 
-# TODO: timeout as a parameter or Settings
-# TODO: Custom exception
-def wait_for_file(path):
-    i = 0
-    timeout = 60
-    while not os.path.exists(path):
-        time.sleep(1)
-        i = i + 1
-        if i > timeout:
-            raise Exception("File still does not exists. Timeout expired")
+_compiler_version = None
+
+
+def get_compiler_version():
+    """
+    Return the version string of the compiler used for builds.
+    """
+    global _compiler_version
+    if _compiler_version is None:
+        cc = shlex.split(os.environ.get("CC", "gcc"))
+        try:
+            p = subprocess.run(cc + ['--version'], stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL,
+                               universal_newlines=True)
+            _compiler_version = p.stdout.strip()
+        except OSError:
+            _compiler_version = "unknown"
+    return _compiler_version
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    Hold an advisory lock on path, created if needed, for the duration of the
+    context.
+    """
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield lock_file
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# ioctl(2) request cloning a file on copy-on-write filesystems (linux/fs.h)
+_FICLONE = 0x40049409
+# Pairs of (source, destination) device known not to support reflinks
+_reflink_unsupported = set()
+
+
+# Bumped on any modification of a TrackedDict
+_tracked_generation = itertools.count(1)
+_tracked_last = 0
+
+
+class TrackedDict(dict):
+    """
+    A dict bumping a process wide generation on each modification. Values
+    derived from tracked dicts, e.g. the environment of a runtime, stay valid
+    as long as get_tracked_generation() does not change.
+    """
+    def _modified(self):
+        global _tracked_last
+        _tracked_last = next(_tracked_generation)
+
+    def __setitem__(self, key, value):
+        super(TrackedDict, self).__setitem__(key, value)
+        self._modified()
+
+    def __delitem__(self, key):
+        super(TrackedDict, self).__delitem__(key)
+        self._modified()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        super(TrackedDict, self).clear()
+        self._modified()
+
+    def pop(self, *args):
+        value = super(TrackedDict, self).pop(*args)
+        self._modified()
+        return value
+
+    def popitem(self):
+        item = super(TrackedDict, self).popitem()
+        self._modified()
+        return item
+
+    def setdefault(self, key, default=None):
+        value = super(TrackedDict, self).setdefault(key, default)
+        self._modified()
+        return value
+
+    def update(self, *args, **kwargs):
+        super(TrackedDict, self).update(*args, **kwargs)
+        self._modified()
+
+
+def get_tracked_generation():
+    return _tracked_last
+
+
+def reflink(src, dst):
+    """
+    Clone src into a new dst file sharing its extents (btrfs, xfs, ...).
+    Metadata are preserved. Return False if the filesystem does not support
+    it.
+    """
+    devices = (os.stat(src).st_dev, os.stat(os.path.dirname(dst) or '.').st_dev)
+    if devices in _reflink_unsupported:
+        return False
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL,
+                               errno.ENOTTY, errno.EPERM):
+                raise
+            _reflink_unsupported.add(devices)
+            cloned = False
+        else:
+            cloned = True
+    if not cloned:
+        os.unlink(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def clone_tree(src, dst, hardlink=None, skip=None):
+    """
+    Clone the src tree into dst, created if needed, preserving timestamps.
+    Files are reflinked when possible. Otherwise they are hard linked when
+    hardlink, a callable taking the path relative to src, returns True and
+    copied if not, or if src and dst are on different devices. Only hard link
+    files that are replaced rather than modified in place. Regular files for
+    which skip returns True are left out.
+    """
+    for root, dirs, files in os.walk(src):
+        rel_root = os.path.relpath(root, src)
+        dst_root = os.path.normpath(os.path.join(dst, rel_root))
+        os.makedirs(dst_root, exist_ok=True)
+        for name in dirs + files:
+            src_path = os.path.join(root, name)
+            dst_path = os.path.join(dst_root, name)
+            if os.path.islink(src_path):
+                os.symlink(os.readlink(src_path), dst_path)
+            elif name in dirs:
+                continue
+            elif skip is not None and skip(os.path.normpath(os.path.join(rel_root, name))):
+                continue
+            elif reflink(src_path, dst_path):
+                continue
+            elif hardlink is not None and hardlink(os.path.normpath(os.path.join(rel_root, name))):
+                try:
+                    os.link(src_path, dst_path)
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+                    shutil.copy2(src_path, dst_path)
+            else:
+                shutil.copy2(src_path, dst_path)
+
+
+def wait_for_file(path, timeout=60):
+    """
+    Wait for path to be created. Raise Readiness.ReadinessError after timeout
+    seconds. See Runtime.wait_for_file to also watch the creating process.
+    """
+    Readiness.wait_for_file(path, timeout)
 
 
 # TODO: find better exception
@@ -66,58 +227,114 @@ def create_empty_file(path):
     open(path, 'w').close()
 
 
-def __dummy_sigusr1_handler(signum, frame):
-    pass
-
-
-def sessiond_spawn(runtime, opt_args=""):
-    agent_port = find_free_port()
-    previous_handler = signal.signal(signal.SIGUSR1, __dummy_sigusr1_handler)
-    cmd = "lttng-sessiond -vvv --verbose-consumer -S --agent-tcp-port {}".format(agent_port)
-    cmd = " ".join([cmd, opt_args])
-    sessiond = runtime.spawn_subprocess(cmd)
-    signal.sigtimedwait({signal.SIGUSR1}, 60)
-    previous_handler = signal.signal(signal.SIGUSR1, previous_handler)
-    return sessiond
+# Attempts at spawning a daemon whose reserved ports were bound meanwhile by
+# a process outside of the harness.
+_spawn_attempts = 3
+_bind_error = "Address already in use"
 
 
-def relayd_spawn(runtime, url="localhost"):
+async def _retry_bind_failure(runtime, subprocess_uuid, attempt):
     """
-    Return a tuple (relayd_uuid, ctrl_port, data_port, live_port)
+    Return True if the daemon subprocess_uuid, which exited before being
+    ready, failed to bind its ports and may be spawned again. It is then
+    discarded from the runtime.
     """
-    ports = find_multiple_free_port(3)
-    data_port = ports.pop()
-    ctrl_port = ports.pop()
-    live_port = ports.pop()
+    if attempt + 1 >= _spawn_attempts:
+        return False
+    if not file_contains(runtime.get_subprocess_stderr_path(subprocess_uuid),
+                         [_bind_error]):
+        return False
+    await runtime.async_discard_subprocess(subprocess_uuid)
+    return True
 
-    base_cmd = "lttng-relayd -vvv"
-    data_string = "-D tcp://{}:{}".format(url, data_port)
-    ctrl_string = "-C tcp://{}:{}".format(url, ctrl_port)
-    live_string = "-L tcp://{}:{}".format(url, live_port)
 
-    cmd = " ".join([base_cmd, data_string, ctrl_string, live_string])
-    relayd = runtime.spawn_subprocess(cmd)
+def sessiond_spawn(runtime, opt_args="", wait_for_agent=False):
+    return runtime.run_until_complete(async_sessiond_spawn(runtime, opt_args,
+                                                           wait_for_agent))
 
-    # Synchronization based on verbosity since no -S is available for
-    # lttng-relayd yet.
-    log_path = runtime.get_subprocess_stderr_path(relayd)
 
-    # TODO: Move to settings.
-    ready_cue = "Listener accepting live viewers connections"
-    # TODO: Move to settings.
-    timeout = 60
-    ready = False
-    for i in range(timeout):
-        if file_contains(log_path, ready_cue):
-            ready = True
-            break
-        time.sleep(1)
+async def async_sessiond_spawn(runtime, opt_args="", wait_for_agent=False):
+    """
+    Spawn a lttng-sessiond and wait for it to be ready, and for its agent
+    port to accept connections if wait_for_agent. Raise
+    Readiness.ReadinessError if it exits or is not ready after 60s.
+    """
+    for attempt in range(_spawn_attempts):
+        # The agent port is reserved until the sessiond is ready
+        with Ports.reserve() as reservation:
+            agent_port = reservation.ports[0]
+            cmd = "lttng-sessiond -vvv --verbose-consumer -S --agent-tcp-port {}".format(agent_port)
+            cmd = " ".join([cmd, opt_args])
+
+            # lttng-sessiond notifies its parent with SIGUSR1 (-S). The
+            # parent is a helper relaying it on a pipe, leaving the signal
+            # handling of the harness untouched.
+            read_fd, write_fd = os.pipe()
+            try:
+                try:
+                    sessiond = await runtime.async_spawn_subprocess(
+                        cmd, pass_fds=(write_fd,),
+                        launcher=NotifyParent.get_launcher(write_fd))
+                finally:
+                    os.close(write_fd)
+                try:
+                    await Readiness.wait_for_notification(read_fd,
+                                                          "lttng-sessiond", 60)
+                    # The agent thread may listen after the notification,
+                    # an agent finding no listener retries seconds later.
+                    if wait_for_agent:
+                        await runtime.async_wait_for_port(
+                            agent_port, subprocess_uuid=sessiond)
+                except Readiness.ExitedError:
+                    if await _retry_bind_failure(runtime, sessiond, attempt):
+                        continue
+                    raise
+            finally:
+                os.close(read_fd)
+        return sessiond
 
-    if not ready:
-        # Cleanup is performed by runtime
-        raise Exception("Relayd readyness timeout expired")
 
-    return (relayd, ctrl_port, data_port, live_port)
+def relayd_spawn(runtime, url="localhost"):
+    """
+    Return a tuple (relayd_uuid, ctrl_port, data_port, live_port)
+    """
+    return runtime.run_until_complete(async_relayd_spawn(runtime, url))
+
+
+async def async_relayd_spawn(runtime, url="localhost"):
+    for attempt in range(_spawn_attempts):
+        # The ports are reserved until the relayd listens on them
+        with Ports.reserve(3) as reservation:
+            data_port, ctrl_port, live_port = reservation.ports
+
+            base_cmd = "lttng-relayd -vvv"
+            data_string = "-D tcp://{}:{}".format(url, data_port)
+            ctrl_string = "-C tcp://{}:{}".format(url, ctrl_port)
+            live_string = "-L tcp://{}:{}".format(url, live_port)
+
+            cmd = " ".join([base_cmd, data_string, ctrl_string, live_string])
+            relayd = await runtime.async_spawn_subprocess(cmd)
+
+            # Synchronization based on verbosity since no -S is available for
+            # lttng-relayd yet. Cleanup is performed by runtime on error.
+            # TODO: Move to settings.
+            ready_cue = "Listener accepting live viewers connections"
+            # TODO: Move to settings.
+            timeout = 60
+            try:
+                await runtime.async_wait_for_output(relayd, ready_cue, timeout)
+                # The cue comes from the live thread, the control and data
+                # ports are bound by other threads. A probe connection is
+                # closed before sending any command.
+                for port in (ctrl_port, data_port):
+                    await runtime.async_wait_for_port(port, url, relayd,
+                                                      timeout)
+            except Readiness.ExitedError:
+                if await _retry_bind_failure(runtime, relayd, attempt):
+                    continue
+                raise
+
+        return (relayd, ctrl_port, data_port, live_port)
 
 
 def find_free_port():
@@ -128,20 +345,6 @@ def find_free_port():
         return s.getsockname()[1]
 
 
-def find_multiple_free_port(number):
-    """
-    Return a list of supposedly free port
-    """
-    assert number >= 0
-    ports = []
-    while(len(ports) != number):
-        port = find_free_port()
-        if port in ports:
-            continue
-        ports.append(port)
-    return ports
-
-
 def file_contains(file_path, list_of_string):
     with open(file_path, 'r') as f:
         for line in f: